@@ -2,3 +2,18 @@
 #  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
 #  3-Clause License. Please see the LICENSE file in the project root directory.
 # ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class ClaimableModel(models.Model):
+    """
+    Objects that background tasks work on. A task claims an object before it starts, see generic.utils.claim(). The
+    claim is kept in these fields instead of as a lock on the row, so it doesn't get in the way of other updates.
+    """
+    claimed_at = models.DateTimeField(_('claimed at'), blank=True, null=True)
+    claimed_by = models.CharField(_('claimed by'), max_length=100, blank=True)
+
+    class Meta:
+        abstract = True
@@ -0,0 +1,30 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from django.core.cache import cache
+
+KEY_PREFIX = 'stats:'
+
+
+def increment_counter(name: str, delta: int = 1):
+    # Counters live in the shared cache so that all workers and spoolers add up to the same number
+    key = KEY_PREFIX + name
+    if cache.add(key, delta, timeout=None):
+        return
+
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Expired between add and incr
+        cache.set(key, delta, timeout=None)
+
+
+def get_counters(names) -> dict:
+    values = cache.get_many([KEY_PREFIX + name for name in names])
+    return {name: values.get(KEY_PREFIX + name, 0) for name in names}
+
+
+def reset_counters(names):
+    cache.delete_many([KEY_PREFIX + name for name in names])
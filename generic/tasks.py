@@ -3,7 +3,13 @@
 #  3-Clause License. Please see the LICENSE file in the project root directory.
 # ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
 
+import pickle
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
 from uwsgi_tasks import task
+from uwsgi_tasks.tasks import SpoolerTask, manage_spool_request
 
 try:
     # noinspection PyPackageRequirements
@@ -11,7 +17,61 @@ try:
 except ImportError:
     uwsgi = None
 
+lanes = threading.local()
+
 
 @task(retry_count=1)
 def do_reload_uwsgi():
     uwsgi.reload()
+
+
+@contextmanager
+def spooler_lane(lane):
+    # Send the tasks started inside this block to the given lane, whatever the lane of their objects is
+    previous = getattr(lanes, 'override', None)
+    lanes.override = lane
+    try:
+        yield
+    finally:
+        lanes.override = previous
+
+
+def get_lane(default):
+    return getattr(lanes, 'override', None) or default
+
+
+def has_spoolers():
+    return uwsgi is not None and 'spooler' in uwsgi.opt
+
+
+def spool(task_factory, lane, *args, at=None, **kwargs):
+    # Start the task on the spooler of the lane. Retries stay in the same lane, the spooler is part of the setup. The
+    # task waits until 'at' if given, a datetime or timedelta. Without spoolers the task runs right away.
+    if not has_spoolers():
+        return task_factory(*args, **kwargs)
+
+    spooler_task = task_factory.get_task(args, kwargs)
+    spooler_task.add_setup(spooler=settings.SPOOLER_LANES[lane])
+    if getattr(lanes, 'override', None):
+        # The tasks that this task starts go to the same lane, see run_spooled_task()
+        spooler_task.add_setup(lane_override=lanes.override)
+    if at is not None:
+        spooler_task.add_setup(at=at)
+    spooler_task.execute_async()
+    return spooler_task
+
+
+def run_spooled_task(message):
+    # A task that was spooled inside spooler_lane() runs inside it as well, so its follow-up tasks don't fall back to
+    # the lanes of their objects
+    try:
+        setup = pickle.loads(SpoolerTask._decode_message(message)['setup'])
+    except Exception:
+        setup = {}
+
+    with spooler_lane(setup.get('lane_override')):
+        return manage_spool_request(message)
+
+
+if uwsgi is not None:
+    uwsgi.spooler = run_spooled_task
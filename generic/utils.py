@@ -4,46 +4,63 @@
 # ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
 
 import os
-
-import time
-from django.db.models import QuerySet
+import socket
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Q, QuerySet, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
 from django.utils.crypto import get_random_string
 from django.utils.termcolors import colorize
 from requests.auth import AuthBase
 
 
-def retry_get(qs: QuerySet, **kwargs):
-    for delay in (0.5, 1, 2, 4, None):
-        try:
-            return qs.get(**kwargs)
-        except qs.model.DoesNotExist:
-            if delay:
-                time.sleep(delay)
-            else:
-                raise
-
-
-def retry_qs(qs: QuerySet, **kwargs):
-    for delay in (0.5, 1, 2, 4, None):
-        result = qs.filter(**kwargs)
-        if result.exists():
-            return result
-        else:
-            if delay:
-                time.sleep(delay)
-            else:
-                return qs.none()
-
-
-def retry_all(qs: QuerySet) -> bool:
-    for delay in (0.5, 1, 2, 4, None):
-        result = all(qs.all())
-        if result:
-            return result
-        elif delay:
-            time.sleep(delay)
-        else:
-            return False
+def get_claim_token():
+    # Different for every claim, so a task only ever releases its own
+    return '{}:{}:{}'.format(socket.gethostname()[:50], os.getpid(), uuid.uuid4().hex)
+
+
+def claim_all(qs: QuerySet) -> list:
+    # Claim the objects of a ClaimableModel queryset that nobody else has claimed, and return them. This is one UPDATE
+    # that only waits for row locks held by others, it never skips an object because someone else is saving it. Claims
+    # that are older than CLAIM_TIMEOUT were left behind by a task that died and are taken over.
+    now = timezone.now()
+    token = get_claim_token()
+    qs.filter(Q(claimed_at=None) | Q(claimed_at__lt=now - timedelta(seconds=settings.CLAIM_TIMEOUT))) \
+        .update(claimed_at=now, claimed_by=token)
+
+    return list(qs.filter(claimed_by=token))
+
+
+def claim(qs: QuerySet, pk):
+    # Claim one object. Returns None if someone else has claimed it.
+    objs = claim_all(qs.filter(pk=pk))
+    if objs:
+        return objs[0]
+
+    if not qs.filter(pk=pk).exists():
+        raise qs.model.DoesNotExist
+
+    return None
+
+
+def release(objs):
+    # Release the claims of claim() and claim_all(), unless they have been taken over in the meantime
+    claims = defaultdict(list)
+    for obj in objs:
+        if obj.claimed_by:
+            claims[type(obj), obj.claimed_by].append(obj.pk)
+
+    for (model, token), pks in claims.items():
+        model.objects.filter(pk__in=pks, claimed_by=token).update(claimed_at=None, claimed_by='')
+
+    for obj in objs:
+        obj.claimed_at = None
+        obj.claimed_by = ''
 
 
 def print_with_color(msg: str, **kwargs):
@@ -109,3 +126,29 @@ class TokenAuth(AuthBase):
 
 def generate_random_token():
     return get_random_string(length=50)
+
+
+def bulk_update(objs, fields, batch_size=100):
+    # Django 2.0 doesn't have QuerySet.bulk_update yet. This does the same: one UPDATE per batch, with a CASE on the
+    # primary key for each field. Like with QuerySet.update() no signals are sent.
+    objs = list(objs)
+    if not objs:
+        return
+
+    model = type(objs[0])
+    model_fields = [model._meta.get_field(name) for name in fields]
+
+    for start in range(0, len(objs), batch_size):
+        batch = objs[start:start + batch_size]
+        updates = {}
+        for field in model_fields:
+            whens = [When(pk=obj.pk, then=Value(getattr(obj, field.attname), output_field=field)) for obj in batch]
+            case = Case(*whens, output_field=field)
+
+            # PostgreSQL can't always determine the type of the CASE from the parameters
+            if connection.vendor == 'postgresql':
+                case = Cast(case, output_field=field)
+
+            updates[field.attname] = case
+
+        model._default_manager.filter(pk__in=[obj.pk for obj in batch]).update(**updates)
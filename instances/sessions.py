@@ -0,0 +1,120 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import os
+import threading
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+from generic.stats import get_counters, increment_counter
+from generic.utils import TokenAuth
+
+session_counters = ('requests', 'reused', 'handshakes', 'failures', 'dropped')
+
+
+def get_generation_key(trillian):
+    return 'trillian_session:{}'.format(trillian.pk)
+
+
+def count_connections(session):
+    # Every new connection in a pool means a new TCP and TLS handshake
+    pools = session.get_adapter('https://').poolmanager.pools
+    return sum(getattr(pools[key], 'num_connections', 0) for key in pools.keys())
+
+
+class TrillianSessions:
+    """
+    Keeps an HTTP session with a pool of keep-alive connections for each Trillian, shared by all the tasks that run in
+    this process. When a Trillian goes down its sessions are dropped in all processes, see drop_sessions().
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.sessions = {}
+
+    def make_session(self, trillian):
+        session = requests.Session()
+        session.auth = TokenAuth(trillian.token)
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=settings.TRILLIAN_POOL_SIZE))
+        return session
+
+    def get_session(self, trillian):
+        generation = cache.get(get_generation_key(trillian), 0)
+        identity = (trillian.hostname, trillian.token, generation)
+
+        with self.lock:
+            if self.pid != os.getpid():
+                # Connections inherited from the parent process can't be used after a fork
+                self.sessions = {}
+                self.pid = os.getpid()
+
+            current = self.sessions.get(trillian.pk)
+            if current and current[0] == identity:
+                return current[1]
+
+            if current:
+                current[1].close()
+                increment_counter('trillian_session.dropped')
+
+            session = self.make_session(trillian)
+            self.sessions[trillian.pk] = identity, session
+            return session
+
+    def close(self, trillian):
+        with self.lock:
+            current = self.sessions.pop(trillian.pk, None)
+
+        if current:
+            current[1].close()
+            increment_counter('trillian_session.dropped')
+
+    def request(self, trillian, method, url, **kwargs):
+        session = self.get_session(trillian)
+        connections = count_connections(session)
+
+        try:
+            response = session.request(method=method, url=url, **kwargs)
+        except requests.ConnectionError:
+            # Don't keep connections around that may be broken
+            increment_counter('trillian_session.failures')
+            self.close(trillian)
+            raise
+
+        handshakes = count_connections(session) - connections
+        increment_counter('trillian_session.requests')
+        if handshakes > 0:
+            increment_counter('trillian_session.handshakes', handshakes)
+        else:
+            increment_counter('trillian_session.reused')
+
+        return response
+
+
+trillian_sessions = TrillianSessions()
+
+
+def trillian_request(trillian, method, url, **kwargs):
+    return trillian_sessions.request(trillian, method, url, **kwargs)
+
+
+def drop_sessions(trillian):
+    # The connections to a Trillian that went down are useless, make every process start new ones
+    key = get_generation_key(trillian)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+    trillian_sessions.close(trillian)
+
+
+def get_session_stats():
+    counters = get_counters(['trillian_session.' + name for name in session_counters])
+    return {name: counters['trillian_session.' + name] for name in session_counters}
@@ -8,20 +8,10 @@ from concurrent.futures import ThreadPoolExecutor
 import requests
 from django.utils import timezone
 from requests import ConnectionError
-from requests.auth import AuthBase
-from requests_futures.sessions import FuturesSession
 from uwsgi_tasks import timer
 
 from instances.models import Trillian
-
-
-class TokenAuth(AuthBase):
-    def __init__(self, token):
-        self.token = token
-
-    def __call__(self, req):
-        req.headers['Authorization'] = 'Token {}'.format(self.token)
-        return req
+from instances.sessions import drop_sessions, trillian_request
 
 
 # noinspection PyUnusedLocal
@@ -31,7 +21,7 @@ def check_trillians(signal_nr):
 
     trillians = Trillian.objects.all()
     info_requests = {}
-    with FuturesSession(executor=ThreadPoolExecutor(max_workers=5)) as session:
+    with ThreadPoolExecutor(max_workers=5) as executor:
         for trillian in trillians:
             if not trillian.token:
                 print("Skipping Trillian {trillian.name} ({trillian.hostname})".format(trillian=trillian))
@@ -40,10 +30,12 @@ def check_trillians(signal_nr):
                     trillian.save()
                 continue
 
-            info_requests[trillian.pk] = trillian, session.request(
+            # Use the same pooled connections as the delegation and cleanup tasks
+            info_requests[trillian.pk] = trillian, executor.submit(
+                trillian_request,
+                trillian=trillian,
                 method='GET',
                 url='https://{}/api/v1/info/'.format(trillian.hostname),
-                auth=TokenAuth(trillian.token),
                 timeout=(5, 10)
             )
 
@@ -56,6 +48,8 @@ def check_trillians(signal_nr):
                 info_responses[pk] = trillian, None
 
     for trillian, response in info_responses.values():
+        was_alive = trillian.is_alive
+
         if response and response.status_code == requests.codes.ok:
             data = response.json()
             trillian.is_alive = True
@@ -64,4 +58,7 @@ def check_trillians(signal_nr):
         else:
             trillian.is_alive = False
 
+        if was_alive and not trillian.is_alive:
+            drop_sessions(trillian)
+
         trillian.save()
@@ -8,6 +8,8 @@ from copy import copy
 
 from django.contrib import admin
 from django.contrib.postgres.fields import JSONField
+from django.urls import reverse
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 from prettyjson import PrettyJSONWidget
@@ -15,8 +17,10 @@ from pygments import highlight
 from pygments.formatters.html import HtmlFormatter
 from pygments.lexers.data import JsonLexer
 
-from measurements.models import InstanceRun, InstanceRunMessage, InstanceRunResult, Schedule, TestRun, TestRunMessage
-from measurements.utils import colored_score
+from generic.tasks import spooler_lane
+from measurements.models import (InstanceRun, InstanceRunMessage, InstanceRunResource, InstanceRunResult, Schedule,
+                                 TestRun, TestRunMessage)
+from measurements.utils import colored_score, tiles_table
 
 
 @admin.register(Schedule)
@@ -58,6 +62,7 @@ class TestRunAdmin(admin.ModelAdmin):
     date_hierarchy = 'requested'
     search_fields = ('url', 'owner__first_name', 'owner__last_name', 'owner__email', 'schedule__name')
     inlines = (TestRunMessageAdmin,)
+    readonly_fields = ('claimed_at', 'claimed_by')
     actions = ('analyse_again',)
 
     def admin_image_score(self, testrun):
@@ -78,9 +83,11 @@ class TestRunAdmin(admin.ModelAdmin):
     # noinspection PyUnusedLocal
     def analyse_again(self, request, queryset):
         # Don't mass-update, we need to trigger the signals
-        for testrun in queryset:
-            testrun.analysed = None
-            testrun.save()
+        with spooler_lane('maintenance'):
+            for testrun in queryset:
+                testrun.analysed = None
+                testrun.save()
+                testrun.recount_scores()
 
     analyse_again.short_description = _('Analyse again')
 
@@ -91,8 +98,10 @@ class InstanceRunMessageAdmin(admin.TabularInline):
 
 class InlineInstanceRunResult(admin.TabularInline):
     model = InstanceRunResult
-    fields = ('marvin', 'when', 'nice_ping_response', 'nice_web_response', 'admin_scores', 'data_image')
-    readonly_fields = ('marvin', 'when', 'nice_ping_response', 'nice_web_response', 'admin_scores', 'data_image')
+    fields = ('marvin', 'when', 'nice_ping_response', 'nice_web_response', 'admin_scores', 'data_image',
+              'admin_image_tiles')
+    readonly_fields = ('marvin', 'when', 'nice_ping_response', 'nice_web_response', 'admin_scores', 'data_image',
+                       'admin_image_tiles')
     extra = 0
     can_delete = False
     show_change_link = True
@@ -148,15 +157,19 @@ class InlineInstanceRunResult(admin.TabularInline):
     admin_scores.short_description = _('scores')
 
     def data_image(self, instance):
-        try:
-            return mark_safe('<img style="width: 300px" src="data:image/png;base64,{}">'.format(
-                instance.web_response['image']
-            ))
-        except (KeyError, TypeError, AttributeError):
+        if not instance.has_image():
             return '-'
 
+        return format_html('<img style="width: 300px" src="{}">',
+                           reverse('v1:instancerunresult-image', args=[instance.pk]))
+
     data_image.short_description = _('image')
 
+    def admin_image_tiles(self, instance):
+        return tiles_table(instance.get_image_tiles())
+
+    admin_image_tiles.short_description = _('image tiles')
+
 
 @admin.register(InstanceRun)
 class InstanceRunAdmin(admin.ModelAdmin):
@@ -170,6 +183,7 @@ class InstanceRunAdmin(admin.ModelAdmin):
                      'trillian__name',)
     autocomplete_fields = ('testrun',)
     inlines = (InstanceRunMessageAdmin, InlineInstanceRunResult)
+    readonly_fields = ('claimed_at', 'claimed_by')
     actions = ('analyse_again',)
 
     def admin_image_score(self, instancerun):
@@ -190,32 +204,37 @@ class InstanceRunAdmin(admin.ModelAdmin):
     # noinspection PyUnusedLocal
     def analyse_again(self, request, queryset):
         # Don't mass-update, we need to trigger the signals
-        testruns = set()
-        for instancerun in queryset:
-            instancerun.analysed = None
-            instancerun.save()
+        with spooler_lane('maintenance'):
+            testruns = set()
+            for instancerun in queryset:
+                instancerun.analysed = None
+                instancerun.save()
 
-            testruns.add(instancerun.testrun)
+                testruns.add(instancerun.testrun)
 
-        for testrun in testruns:
-            testrun.analysed = None
-            testrun.save()
+            # The instance runs that are analysed again will add their scores again
+            for testrun in testruns:
+                testrun.analysed = None
+                testrun.save()
+                testrun.recount_scores()
 
     analyse_again.short_description = _('Analyse again')
 
 
 @admin.register(InstanceRunResult)
 class InstanceRunResultAdmin(admin.ModelAdmin):
-    list_display = ('instancerun', 'marvin', 'analysed',
+    list_display = ('instancerun', 'marvin', 'analysed', 'image_class',
                     'admin_image_score', 'admin_resource_score', 'admin_overall_score')
-    list_filter = (('marvin', admin.RelatedOnlyFieldListFilter),)
+    list_filter = (('marvin', admin.RelatedOnlyFieldListFilter), 'image_class', 'analysis_version')
     date_hierarchy = 'instancerun__testrun__requested'
     search_fields = ('instancerun__testrun__url',
                      'instancerun__testrun__owner__first_name', 'instancerun__testrun__owner__last_name',
                      'instancerun__testrun__owner__email',
                      'instancerun__testrun__schedule__name',
-                     'marvin__trillian__name',)
+                     'marvin__trillian__name',
+                     '=image_digest',)
     autocomplete_fields = ('instancerun',)
+    readonly_fields = ('admin_image_tiles', 'analysis_version', 'analysis_timings', 'claimed_at', 'claimed_by')
     actions = ('analyse_again',)
 
     def admin_image_score(self, result):
@@ -223,6 +242,11 @@ class InstanceRunResultAdmin(admin.ModelAdmin):
 
     admin_image_score.short_description = _('image score')
 
+    def admin_image_tiles(self, result):
+        return tiles_table(result.get_image_tiles(), cell_size=20)
+
+    admin_image_tiles.short_description = _('image tiles')
+
     def admin_resource_score(self, result):
         return colored_score(result.resource_score)
 
@@ -236,25 +260,35 @@ class InstanceRunResultAdmin(admin.ModelAdmin):
     # noinspection PyUnusedLocal
     def analyse_again(self, request, queryset):
         # Don't mass-update, we need to trigger the signals
-        instanceruns = set()
-        for result in queryset:
-            result.analysed = None
-            result.save()
-            result.trigger_analysis()
+        with spooler_lane('maintenance'):
+            instanceruns = set()
+            for result in queryset:
+                result.analysed = None
+                result.save()
+                result.trigger_analysis()
 
-            instanceruns.add(result.instancerun)
+                instanceruns.add(result.instancerun)
 
-        testruns = set()
-        for instancerun in instanceruns:
-            instancerun.analysed = None
-            instancerun.save()
-            instancerun.trigger_analysis()
+            testruns = set()
+            for instancerun in instanceruns:
+                instancerun.analysed = None
+                instancerun.save()
+                instancerun.trigger_analysis()
 
-            testruns.add(instancerun.testrun)
+                testruns.add(instancerun.testrun)
 
-        for testrun in testruns:
-            testrun.analysed = None
-            testrun.save()
-            testrun.trigger_analysis()
+            for testrun in testruns:
+                testrun.analysed = None
+                testrun.save()
+                testrun.recount_scores()
+                testrun.trigger_analysis()
 
     analyse_again.short_description = _('Analyse again')
+
+
+@admin.register(InstanceRunResource)
+class InstanceRunResourceAdmin(admin.ModelAdmin):
+    list_display = ('result', 'host', 'resource_type', 'success', 'status')
+    list_filter = ('resource_type', 'success')
+    search_fields = ('=host', 'url')
+    raw_id_fields = ('result',)
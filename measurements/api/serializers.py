@@ -9,8 +9,8 @@ from django.db.transaction import atomic
 from django.utils import timezone
 from django.utils.translation import gettext as _
 from rest_framework.exceptions import ValidationError as RestValidationError
-from rest_framework.fields import CurrentUserDefault, FloatField, HiddenField
-from rest_framework.relations import HyperlinkedRelatedField
+from rest_framework.fields import CurrentUserDefault, FloatField, HiddenField, SerializerMethodField
+from rest_framework.relations import HyperlinkedIdentityField, HyperlinkedRelatedField
 from rest_framework.serializers import HyperlinkedModelSerializer
 from rest_framework_serializer_extensions.serializers import SerializerExtensionsMixin
 
@@ -20,8 +20,10 @@ from generic.utils import print_warning
 from instances.api.serializers import MarvinSerializer, TrillianSerializer
 from instances.models import Marvin, Trillian, instance_type_choices
 from measurements.api.filters import score_types
-from measurements.models import (InstanceRun, InstanceRunMessage, InstanceRunResult, Schedule, TestRun, TestRunAverage,
-                                 TestRunMessage)
+from measurements.images import store_screenshot
+from measurements.models import (InstanceRun, InstanceRunMessage, InstanceRunResource, InstanceRunResult, Schedule,
+                                 TestRun, TestRunAverage, TestRunMessage)
+from measurements.utils import get_resource_properties, get_resource_rows
 
 
 class ScheduleSerializer(SerializerExtensionsMixin, HyperlinkedModelSerializer):
@@ -66,10 +68,10 @@ class TestRunSerializer(SerializerExtensionsMixin, HyperlinkedModelSerializer):
                   'url', 'requested', 'started', 'finished', 'is_public',
                   'image_score', 'image_feedback',
                   'resource_score', 'resource_feedback',
-                  'overall_score', 'overall_feedback',
+                  'overall_score', 'overall_feedback', 'score_count',
                   'trillians', 'messages', 'instanceruns',
                   '_url')
-        read_only_fields = ('owner',)
+        read_only_fields = ('owner', 'score_count')
         expandable_fields = dict(
             owner=UserSerializer,
             trillians=dict(
@@ -147,7 +149,7 @@ class TestRunAverageSerializer(HyperlinkedModelSerializer):
     class Meta:
         model = TestRunAverage
         fields = ('id', 'instance_type',
-                  'image_score', 'resource_score', 'overall_score',
+                  'image_score', 'resource_score', 'overall_score', 'score_count',
                   '_url')
 
 
@@ -200,16 +202,30 @@ class InstanceRunSerializer(SerializerExtensionsMixin, HyperlinkedModelSerialize
                 # We need marvin to be able to store data
                 continue
 
-            InstanceRunResult.objects.update_or_create(
+            # Keep the screenshot out of the database
+            web_response, image_properties = store_screenshot(result.get('web_response', {}))
+            resource_properties = get_resource_properties(web_response.get('resources'))
+
+            instance_run_result, new_result = InstanceRunResult.objects.update_or_create(
                 defaults={
                     'when': result.get('when', timezone.now()),
                     'ping_response': result.get('ping_response', {}),
-                    'web_response': result.get('web_response', {}),
+                    'web_response': web_response,
+                    **image_properties,
+                    **resource_properties,
                 },
                 instancerun=instance,
                 marvin=marvin
             )
 
+            # Store the individual resources for querying across results
+            resources = [InstanceRunResource(result=instance_run_result, **row)
+                         for row in get_resource_rows(web_response.get('resources'))]
+            with atomic():
+                if not new_result:
+                    instance_run_result.resources.all().delete()
+                InstanceRunResource.objects.bulk_create(resources, batch_size=1000)
+
         messages = {(message['severity'], message['message'])
                     for message in validated_data.pop('messages', [])
                     if 'severity' in message and 'message' in message}
@@ -238,22 +254,41 @@ class InstanceRunMessageSerializer(HyperlinkedModelSerializer):
         fields = ('id', 'severity', 'message', '_url')
 
 
+class InstanceRunResourceSerializer(HyperlinkedModelSerializer):
+    class Meta:
+        model = InstanceRunResource
+        fields = ('id', 'result', 'result_id', 'url', 'host', 'resource_type', 'success', 'status', '_url')
+
+
 class InstanceRunResultSerializer(SerializerExtensionsMixin, HyperlinkedModelSerializer):
     web_response = SerializerExtensionsJSONField()
     ping_response = SerializerExtensionsJSONField()
+    image = HyperlinkedIdentityField(view_name='instancerunresult-image')
+    image_tiles = SerializerMethodField()
 
     class Meta:
         model = InstanceRunResult
         fields = ('id', 'marvin', 'marvin_id', 'instancerun', 'instancerun_id', 'instance_type',
-                  'when', 'ping_response', 'web_response',
-                  'image_score', 'image_feedback',
+                  'when', 'ping_response', 'web_response', 'image', 'image_digest', 'image_hash', 'image_class',
+                  'image_score', 'image_feedback', 'image_tiles',
+                  'resources_ok', 'resources_fail', 'resource_stats',
                   'resource_score', 'resource_feedback',
                   'overall_score', 'overall_feedback',
                   '_url')
 
-        read_only_fields = ('instancerun',)
+        read_only_fields = ('instancerun', 'image_digest', 'image_hash', 'image_class',
+                            'resources_ok', 'resources_fail', 'resource_stats')
 
         expandable_fields = dict(
             marvin=MarvinSerializer,
             instancerun="measurements.api.serializers.InstanceRunSerializer",
         )
+
+    # noinspection PyMethodMayBeStatic
+    def get_image_tiles(self, result):
+        # The SSIM per tile, row by row from the top-left of the page
+        tiles = result.get_image_tiles()
+        if tiles is None:
+            return None
+
+        return [[round(float(score), 3) for score in row] for row in tiles]
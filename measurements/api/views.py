@@ -3,9 +3,14 @@
 #  3-Clause License. Please see the LICENSE file in the project root directory.
 # ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
 
+from django.conf import settings
 from django.db.models import Avg
 from django.db.models.query_utils import Q
+from django.http import FileResponse, Http404
+from django.utils.cache import patch_cache_control
+from rest_framework.decorators import action
 from rest_framework.mixins import UpdateModelMixin
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from rest_framework_serializer_extensions.views import SerializerExtensionsAPIViewMixin
 
@@ -14,11 +19,11 @@ from measurements.api.filters import ScheduleFilter, TestRunFilter, score_types
 from measurements.api.permissions import (CreatePublicBasedPermission, InstanceRunPermission, OwnerBasedPermission,
                                           OwnerOrPublicBasedPermission)
 from measurements.api.serializers import (CreatePublicTestRunSerializer, CreateTestRunSerializer,
-                                          InstanceRunMessageSerializer, InstanceRunResultSerializer,
-                                          InstanceRunSerializer, ScheduleSerializer, TestRunAverageSerializer,
-                                          TestRunMessageSerializer, TestRunSerializer)
-from measurements.models import (InstanceRun, InstanceRunMessage, InstanceRunResult, Schedule, TestRun, TestRunAverage,
-                                 TestRunMessage)
+                                          InstanceRunMessageSerializer, InstanceRunResourceSerializer,
+                                          InstanceRunResultSerializer, InstanceRunSerializer, ScheduleSerializer,
+                                          TestRunAverageSerializer, TestRunMessageSerializer, TestRunSerializer)
+from measurements.models import (InstanceRun, InstanceRunMessage, InstanceRunResource, InstanceRunResult, Schedule,
+                                 TestRun, TestRunAverage, TestRunMessage)
 
 
 class ScheduleViewSet(SerializerExtensionsAPIViewMixin, ModelViewSet):
@@ -272,6 +277,12 @@ class InstanceRunResultViewSet(SerializerExtensionsAPIViewMixin, ReadOnlyModelVi
 
     retrieve:
     Retrieve the details of a single instance run result.
+
+    similar:
+    Retrieve the instance run results for the same URL with a screenshot that looks like the one of this result.
+
+    image:
+    Retrieve the screenshot of this result as a PNG image.
     """
     permission_classes = (OwnerOrPublicBasedPermission,)
     serializer_class = InstanceRunResultSerializer
@@ -279,6 +290,10 @@ class InstanceRunResultViewSet(SerializerExtensionsAPIViewMixin, ReadOnlyModelVi
         'instancerun': ['exact'],
         'marvin': ['exact'],
         'when': ['gte', 'lte'],
+        'image_digest': ['exact'],
+        'image_hash': ['exact'],
+        'resources_ok': ['gt', 'gte', 'lt', 'lte', 'exact'],
+        'resources_fail': ['gt', 'gte', 'lt', 'lte', 'exact'],
     }
     ordering_fields = ('id', 'when', 'instancerun__started', 'instancerun__finished', 'instancerun__analysed')
     ordering = ('instancerun__started', 'id')
@@ -295,6 +310,75 @@ class InstanceRunResultViewSet(SerializerExtensionsAPIViewMixin, ReadOnlyModelVi
             return InstanceRunResult.objects.filter(Q(instancerun__testrun__is_public=True) |
                                                     Q(instancerun__testrun__owner=self.request.user))
 
+    # noinspection PyUnusedLocal
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        result = self.get_object()
+
+        # Comparing hashes can't use an index, only look at the results for the same URL
+        queryset = self.filter_queryset(self.get_queryset()) \
+            .filter(instancerun__testrun__url=result.instancerun.testrun.url) \
+            .similar_images(result.image_hash, settings.IMAGE_HASH_MAX_DISTANCE) \
+            .exclude(pk=result.pk)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    # noinspection PyUnusedLocal
+    @action(detail=True)
+    def image(self, request, pk=None):
+        result = self.get_object()
+        image_file = result.open_image()
+        if image_file is None:
+            raise Http404
+
+        # Screenshots never change, the store is content-addressed
+        response = FileResponse(image_file, content_type='image/png')
+        patch_cache_control(response, private=True, max_age=365 * 24 * 60 * 60)
+        return response
+
+
+class InstanceRunResourceViewSet(SerializerExtensionsAPIViewMixin, ReadOnlyModelViewSet):
+    """
+    list:
+    Retrieve a list of resources loaded by instance runs, for example all failed resources from one host.
+
+    retrieve:
+    Retrieve the details of a single resource.
+    """
+    permission_classes = (OwnerOrPublicBasedPermission,)
+    serializer_class = InstanceRunResourceSerializer
+    filter_fields = {
+        'result': ['exact'],
+        'result__instancerun': ['exact'],
+        'result__instancerun__testrun': ['exact'],
+        'result__marvin__instance_type': ['exact'],
+        'result__when': ['gte', 'lte'],
+        'host': ['exact', 'endswith'],
+        'resource_type': ['exact'],
+        'success': ['exact'],
+        'status': ['gte', 'lte', 'exact'],
+    }
+    ordering_fields = ('id', 'host', 'resource_type', 'status')
+    ordering = ('id',)
+
+    def get_queryset(self):
+        if not self.request:
+            # Docs get the queryset without having a request
+            return InstanceRunResource.objects.none()
+        elif self.request.user.is_anonymous:
+            return InstanceRunResource.objects.filter(result__instancerun__testrun__is_public=True)
+        elif self.request.user.is_superuser:
+            return InstanceRunResource.objects.all()
+        else:
+            return InstanceRunResource.objects.filter(Q(result__instancerun__testrun__is_public=True) |
+                                                      Q(result__instancerun__testrun__owner=self.request.user))
+
 
 class InstanceRunMessageViewSet(SerializerExtensionsAPIViewMixin, ReadOnlyModelViewSet):
     """
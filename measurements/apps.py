@@ -14,3 +14,5 @@ class MeasurementsConfig(AppConfig):
     def ready(self):
         # noinspection PyUnresolvedReferences
         from . import signals
+        # noinspection PyUnresolvedReferences
+        from .tasks import sweeper
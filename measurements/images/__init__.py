@@ -0,0 +1,14 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from .cache import image_cache
+from .classify import image_class_choices, is_degraded
+from .compare import compare_images, get_decision_stats
+from .decode import decode_base64_image
+from .engine import comparison_engine
+from .hashing import estimate_image_score
+from .properties import get_image_properties, store_screenshot
+from .store import screenshot_store
+from .tiles import pack_tiles, unpack_tiles
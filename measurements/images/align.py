@@ -0,0 +1,61 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import numpy as np
+from django.conf import settings
+from skimage.util.dtype import dtype_range
+
+
+def describe_shape(img):
+    return '{}x{}'.format(img.shape[1], img.shape[0])
+
+
+def to_rgb(img):
+    if img.ndim == 2:
+        return np.stack([img] * 3, axis=2)
+    elif img.shape[2] == 1:
+        return np.concatenate([img] * 3, axis=2)
+    else:
+        return img[:, :, :3]
+
+
+def align_images(baseline, candidate):
+    # Make both images the same shape so they can always be compared, and describe what was changed
+    notes = []
+
+    if baseline.ndim != candidate.ndim or baseline.shape[2:] != candidate.shape[2:]:
+        baseline, candidate = to_rgb(baseline), to_rgb(candidate)
+        notes.append('converted to RGB')
+
+    if baseline.dtype != candidate.dtype:
+        # Only happens with weird PNGs, compare them as floating point
+        baseline = baseline / dtype_range[baseline.dtype.type][1]
+        candidate = candidate / dtype_range[candidate.dtype.type][1]
+        notes.append('converted to floating point')
+
+    if baseline.shape[:2] != candidate.shape[:2]:
+        original = 'baseline {}, candidate {}'.format(describe_shape(baseline), describe_shape(candidate))
+
+        if settings.IMAGE_ALIGN_MODE == 'pad':
+            # Extend both to the largest size with white
+            height = max(baseline.shape[0], candidate.shape[0])
+            width = max(baseline.shape[1], candidate.shape[1])
+            white = dtype_range[baseline.dtype.type][1]
+
+            def pad(img):
+                padding = [(0, height - img.shape[0]), (0, width - img.shape[1])] + [(0, 0)] * (img.ndim - 2)
+                return np.pad(img, padding, mode='constant', constant_values=white)
+
+            baseline, candidate = pad(baseline), pad(candidate)
+            notes.append('padded to {} ({})'.format(describe_shape(baseline), original))
+        else:
+            # Crop both to the viewport they have in common, starting at the top-left corner
+            height = min(baseline.shape[0], candidate.shape[0])
+            width = min(baseline.shape[1], candidate.shape[1])
+
+            baseline, candidate = baseline[:height, :width], candidate[:height, :width]
+            notes.append('cropped to {} ({})'.format(describe_shape(baseline), original))
+
+    return baseline, candidate, ', '.join(notes)
@@ -0,0 +1,113 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+from django.conf import settings
+
+from measurements.images.decode import decode_base64_image, decode_image_file
+from measurements.images.store import screenshot_store
+
+
+class ImageCache:
+    """
+    Decoded screenshots stored as .npy files on local disk. Files are opened memory-mapped, so all spooler processes
+    on a node share the same pages instead of each decoding and holding their own copy.
+    """
+
+    def __init__(self, directory=None, max_size=None):
+        self._directory = directory
+        self._max_size = max_size
+
+    @property
+    def directory(self):
+        return self._directory or settings.IMAGE_CACHE_DIR
+
+    @property
+    def max_size(self):
+        return self._max_size if self._max_size is not None else settings.IMAGE_CACHE_SIZE
+
+    @staticmethod
+    def content_hash(img_b64):
+        return hashlib.sha1(img_b64.encode('ascii')).hexdigest()
+
+    def get_path(self, digest):
+        return os.path.join(self.directory, digest + '.npy')
+
+    def get_filename(self, digest, img_b64=None):
+        # Old results have the screenshot in their web response instead of in the store, and maybe no digest
+        path = self.get_path(digest or self.content_hash(img_b64))
+
+        try:
+            # Mark as recently used, the mtime is what eviction looks at
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Decode straight into a temporary file and move it into place, so other processes never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+
+        def allocate(shape, dtype):
+            return np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=shape)
+
+        try:
+            if img_b64:
+                img = decode_base64_image(img_b64, allocate)
+            else:
+                img = decode_image_file(screenshot_store.get_path(digest), allocate)
+
+            img.flush()
+            del img
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+        self.evict()
+        return path
+
+    def get(self, digest, img_b64=None):
+        return np.load(self.get_filename(digest, img_b64), mmap_mode='r')
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.npy'):
+                continue
+
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                # Evicted by another process
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(entry[1] for entry in entries)
+        if total <= self.max_size:
+            return
+
+        # Least recently used first. Unlinking is safe for processes that still have the file mapped.
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_size:
+                break
+
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+            total -= size
+
+
+image_cache = ImageCache()
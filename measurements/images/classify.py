@@ -0,0 +1,83 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import numpy as np
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+
+image_class_choices = [
+    ('', _('Normal')),
+    ('error', _('Error page')),
+    ('blank', _('Blank page')),
+]
+
+# Less content means a lower rank
+image_class_ranks = {
+    'blank': 0,
+    'error': 1,
+    '': 2,
+}
+
+# Only look at every Nth pixel in both directions, that is plenty for statistics
+SAMPLE_STEP = 4
+
+
+def to_uint8(img):
+    # 1-bit PNGs decode to booleans and 16-bit ones to uint16, floats are expected between 0 and 1 like in skimage
+    if img.dtype == np.uint8:
+        return img
+
+    if img.dtype == np.bool_:
+        return img.astype(np.uint8) * 255
+
+    if np.issubdtype(img.dtype, np.integer):
+        scaled = img.astype(np.float64) * 255 / np.iinfo(img.dtype).max
+    else:
+        scaled = img.astype(np.float64) * 255
+
+    return np.clip(scaled, 0, 255).astype(np.uint8)
+
+
+def image_statistics(img):
+    sample = np.asarray(img[::SAMPLE_STEP, ::SAMPLE_STEP])
+    if sample.ndim == 2:
+        sample = sample[:, :, np.newaxis]
+
+    # Drop alpha and scale to 8 bits
+    sample = to_uint8(sample[:, :, :3])
+
+    # Fraction of the pixels that have the most common colour
+    packed = np.zeros(sample.shape[:2], dtype=np.uint32)
+    for channel in range(sample.shape[2]):
+        packed = (packed << 8) | sample[:, :, channel]
+    colours, counts = np.unique(packed, return_counts=True)
+    dominance = counts.max() / packed.size
+
+    # Shannon entropy of the brightness histogram in bits
+    histogram = np.bincount(sample.mean(axis=2).astype(np.uint8).ravel(), minlength=256)
+    probabilities = histogram[histogram > 0] / histogram.sum()
+    entropy = -np.sum(probabilities * np.log2(probabilities))
+
+    return abs(float(entropy)), float(dominance)
+
+
+def classify_image(entropy, dominance):
+    if entropy is None or dominance is None:
+        return ''
+
+    if dominance >= settings.IMAGE_BLANK_DOMINANCE:
+        return 'blank'
+
+    if entropy <= settings.IMAGE_ERROR_MAX_ENTROPY and dominance >= settings.IMAGE_ERROR_DOMINANCE:
+        return 'error'
+
+    return ''
+
+
+def is_degraded(image_class, baseline_classes):
+    # A screenshot is degraded if it has less content than every baseline
+    rank = image_class_ranks.get(image_class, image_class_ranks[''])
+    return bool(baseline_classes) and all(rank < image_class_ranks.get(base_class, image_class_ranks[''])
+                                          for base_class in baseline_classes)
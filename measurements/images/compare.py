@@ -0,0 +1,103 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from django.conf import settings
+from django.utils.translation import gettext_noop
+from skimage.transform import downscale_local_mean
+from skimage.util.dtype import dtype_range
+
+from generic.stats import get_counters, increment_counter
+from measurements.images.align import align_images
+from measurements.images.ssim import BaselineSSIM
+
+# The SSIM window is 7x7, (downscaled) images must at least be that big
+MIN_SIZE = 7
+
+# The notes are stored with the results, they are translated when they are shown
+BASELINE_TOO_SMALL = gettext_noop('The baseline screenshot is too small to compare')
+ALIGNED = gettext_noop('The screenshots have different sizes or formats and were aligned before comparing them')
+ALIGNED_TOO_SMALL = gettext_noop('The screenshots have too little in common to compare')
+
+
+def get_decision_levels():
+    return ['pyramid-{}'.format(factor) for factor in settings.IMAGE_PYRAMID_FACTORS] + ['full']
+
+
+def get_decision_stats():
+    names = ['image_compare.' + level for level in get_decision_levels()]
+    counters = get_counters(names)
+    return {level: counters['image_compare.' + level] for level in get_decision_levels()}
+
+
+def count_decision(level):
+    increment_counter('image_compare.' + level)
+
+
+def downscale(img, factor):
+    factors = (factor, factor) + (1,) * (img.ndim - 2)
+    return downscale_local_mean(img, factors)
+
+
+def compare_to_baseline(baseline, candidates):
+    # Score all candidates against one baseline, computing the baseline statistics only once per level.
+    # Returns a (score, note, tiles) tuple for each candidate, where the note says if the images had to be aligned
+    # and tiles is a grid with the SSIM per part of the page, or None if it couldn't be determined.
+    if min(baseline.shape[:2]) < MIN_SIZE:
+        return [(0.0, BASELINE_TOO_SMALL, None)] * len(candidates)
+
+    grid_size = settings.IMAGE_TILE_GRID
+    scores = [None] * len(candidates)
+    notes = [''] * len(candidates)
+    tiles = [None] * len(candidates)
+    todo = [index for index, candidate in enumerate(candidates)
+            if candidate.shape == baseline.shape and candidate.dtype == baseline.dtype]
+
+    if settings.IMAGE_COMPARE_MODE == 'pyramid':
+        data_range = dtype_range[baseline.dtype.type][1] - dtype_range[baseline.dtype.type][0]
+
+        # Coarsest level first
+        for factor in sorted(settings.IMAGE_PYRAMID_FACTORS, reverse=True):
+            if not todo or min(baseline.shape[:2]) // factor < MIN_SIZE:
+                continue
+
+            ssim = BaselineSSIM(downscale(baseline, factor), data_range=data_range)
+            level_scores = ssim.score_tiles([downscale(candidates[index], factor) for index in todo], grid_size)
+
+            # Only decide here if the result is clear, borderline cases go to the next level
+            undecided = []
+            for index, (score, level_tiles) in zip(todo, level_scores):
+                if score >= settings.IMAGE_PYRAMID_ACCEPT or score <= settings.IMAGE_PYRAMID_REJECT:
+                    scores[index] = score
+                    tiles[index] = level_tiles
+                    count_decision('pyramid-{}'.format(factor))
+                else:
+                    undecided.append(index)
+
+            todo = undecided
+
+    if todo:
+        ssim = BaselineSSIM(baseline)
+        full_scores = ssim.score_tiles([candidates[index] for index in todo], grid_size)
+        for index, (score, full_tiles) in zip(todo, full_scores):
+            scores[index] = score
+            tiles[index] = full_tiles
+            count_decision('full')
+
+    # Different shapes, align them first
+    for index, candidate in enumerate(candidates):
+        if scores[index] is None:
+            aligned_baseline, aligned_candidate, _ = align_images(baseline, candidate)
+            if min(aligned_candidate.shape[:2]) < MIN_SIZE:
+                scores[index] = 0.0
+                notes[index] = ALIGNED_TOO_SMALL
+            else:
+                notes[index] = ALIGNED
+                scores[index], _, tiles[index] = compare_to_baseline(aligned_baseline, [aligned_candidate])[0]
+
+    return list(zip(scores, notes, tiles))
+
+
+def compare_images(img1, img2):
+    return compare_to_baseline(img1, [img2])[0][0]
@@ -0,0 +1,129 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import binascii
+import io
+import threading
+
+import numpy as np
+import skimage.io
+from PIL import Image
+
+# Base64 characters decoded at a time, a multiple of 4 so chunks without whitespace need no carry-over
+CHUNK_SIZE = 64 * 1024
+
+# Rows copied out of PIL at a time
+STRIP_ROWS = 256
+
+# Modes that map directly to the arrays skimage.io.imread would return, others go through skimage
+DIRECT_MODES = {
+    'L': (),
+    'RGB': (3,),
+    'RGBA': (4,),
+}
+
+buffers = threading.local()
+
+
+class MemoryReader(io.RawIOBase):
+    """
+    Read-only file object on top of a memoryview, so that PIL can read the PNG without copying it into a BytesIO.
+    """
+
+    def __init__(self, view):
+        super().__init__()
+        self.view = view
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.view[self.position:self.position + len(buffer)]
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        else:
+            self.position = len(self.view) + offset
+
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
+def get_buffer(size):
+    # One growing buffer per thread, reused for every image instead of allocating a new bytes object each time
+    buffer = getattr(buffers, 'buffer', None)
+    if buffer is None or len(buffer) < size:
+        buffer = bytearray(size)
+        buffers.buffer = buffer
+
+    return buffer
+
+
+def decode_base64(img_b64):
+    # Decode in chunks into the shared buffer, never holding a full ASCII copy or a separate bytes object.
+    # Returns a memoryview on the buffer that is only valid until the next call in this thread.
+    buffer = get_buffer(len(img_b64) * 3 // 4 + 3)
+    view = memoryview(buffer)
+    length = 0
+
+    carry = ''
+    for start in range(0, len(img_b64), CHUNK_SIZE):
+        chunk = carry + ''.join(img_b64[start:start + CHUNK_SIZE].split())
+
+        # Only decode complete groups of 4 characters, the rest goes with the next chunk
+        usable = len(chunk) - len(chunk) % 4
+        chunk, carry = chunk[:usable], chunk[usable:]
+
+        data = binascii.a2b_base64(chunk)
+        view[length:length + len(data)] = data
+        length += len(data)
+
+    if carry:
+        raise binascii.Error('Incorrect padding')
+
+    return view[:length]
+
+
+def decode_png(img_bytes, allocate=np.empty):
+    # Decode into an array from allocate(shape, dtype), for example a memory-mapped file. The pixels are copied
+    # out of PIL in strips, so there is never a second full-size copy of the image on the heap.
+    with Image.open(MemoryReader(img_bytes)) as img:
+        if img.mode not in DIRECT_MODES:
+            decoded = skimage.io.imread(MemoryReader(img_bytes))
+            out = allocate(decoded.shape, decoded.dtype)
+            out[...] = decoded
+            return out
+
+        width, height = img.size
+        channels = DIRECT_MODES[img.mode]
+        out = allocate((height, width) + channels, np.uint8)
+
+        for top in range(0, height, STRIP_ROWS):
+            bottom = min(top + STRIP_ROWS, height)
+            strip = img.crop((0, top, width, bottom)).tobytes()
+            out[top:bottom] = np.frombuffer(strip, dtype=np.uint8).reshape((bottom - top, width) + channels)
+
+        return out
+
+
+def decode_base64_image(img_b64, allocate=np.empty):
+    return decode_png(decode_base64(img_b64), allocate)
+
+
+def decode_image_file(path, allocate=np.empty):
+    # The file is mapped instead of read, PIL reads the PNG straight from the page cache
+    return decode_png(memoryview(np.memmap(path, dtype=np.uint8, mode='r')), allocate)
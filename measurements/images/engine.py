@@ -0,0 +1,146 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import os
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import numpy as np
+from django.conf import settings
+
+from measurements.images.compare import compare_to_baseline
+
+try:
+    # noinspection PyPackageRequirements
+    import uwsgi
+except ImportError:
+    uwsgi = None
+
+BLAS_THREAD_VARIABLES = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+
+def get_blas_threads():
+    for variable in BLAS_THREAD_VARIABLES:
+        value = os.environ.get(variable, '')
+        if value.isdigit() and int(value) > 0:
+            return int(value)
+
+    # Unconfigured BLAS libraries start a thread per CPU
+    return os.cpu_count() or 1
+
+
+def get_spooler_processes():
+    # Every spooler process has a pool of its own, uWSGI starts spooler-processes for each spooler
+    if uwsgi is None:
+        return 1
+
+    spoolers = uwsgi.opt.get('spooler', [])
+    if not isinstance(spoolers, list):
+        spoolers = [spoolers]
+
+    processes = uwsgi.opt.get('spooler-processes', b'1')
+    if isinstance(processes, list):
+        processes = processes[-1]
+
+    return max(1, len(spoolers) * int(processes))
+
+
+def get_worker_count():
+    # Every worker can run a BLAS thread pool of its own, don't start more threads than there are CPUs
+    available = max(1, (os.cpu_count() or 1) // get_blas_threads())
+    if settings.IMAGE_COMPARE_WORKERS:
+        available = min(settings.IMAGE_COMPARE_WORKERS, available)
+
+    # The workers are shared by all spooler processes on this node
+    return max(1, available // get_spooler_processes())
+
+
+worker_pid = None
+
+
+def init_worker():
+    global worker_pid
+    if worker_pid == os.getpid():
+        return
+
+    # Connections to the cache are inherited from the parent, don't share the sockets
+    from django.core.cache import caches
+    for cache in caches.all():
+        cache.close()
+
+    worker_pid = os.getpid()
+
+
+def compare_files(baseline_filename, candidate_filenames):
+    # Python 3.6 executors have no initializer, so do it on the first call
+    init_worker()
+    return compare_to_baseline(np.load(baseline_filename, mmap_mode='r'),
+                               [np.load(filename, mmap_mode='r') for filename in candidate_filenames])
+
+
+class ComparisonEngine:
+    """
+    Runs the CPU-bound image comparisons in a pool of worker processes. Images are passed to the workers as
+    filenames from the image cache, the workers map them from disk instead of receiving pickled arrays.
+    """
+
+    def __init__(self, workers=None):
+        self._workers = workers
+        self._executor = None
+        self._pid = None
+
+    @property
+    def workers(self):
+        return self._workers or get_worker_count()
+
+    @property
+    def executor(self):
+        # A pool can't be used across a fork, start a new one in each process
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._pid = os.getpid()
+
+        return self._executor
+
+    def compare_jobs(self, jobs):
+        # Each job is a (baseline filename, [candidate filenames]) tuple and is handled by one worker, so the
+        # baseline statistics are only computed once. Returns a list of (score, note, tiles) tuples for each job.
+        futures = [self.executor.submit(compare_files, baseline, candidates) for baseline, candidates in jobs]
+
+        # Don't wait forever for a worker that hangs, the task has to finish well before its claims expire
+        done, not_done = wait(futures, timeout=settings.IMAGE_COMPARE_TIMEOUT or None)
+        if not_done:
+            for future in not_done:
+                future.cancel()
+
+            # The hanging workers would take up the pool, start a new one next time
+            self.abandon()
+            raise TimeoutError('Comparing screenshots took more than {} seconds'.format(
+                settings.IMAGE_COMPARE_TIMEOUT
+            ))
+
+        return [future.result() for future in futures]
+
+    def compare_to_baselines(self, candidate, baselines):
+        # Score one candidate against all baselines, returns a (score, note, tiles) tuple for each baseline
+        return [scores[0] for scores in self.compare_jobs([(baseline, [candidate]) for baseline in baselines])]
+
+    def abandon(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+            for process in list((self._executor._processes or {}).values()):
+                process.terminate()
+
+        self._executor = None
+        self._pid = None
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown()
+
+        self._executor = None
+        self._pid = None
+
+
+comparison_engine = ComparisonEngine()
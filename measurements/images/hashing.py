@@ -0,0 +1,67 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import hashlib
+
+import numpy as np
+from django.conf import settings
+
+HASH_BITS = 64
+
+
+def image_digest(img_bytes):
+    return hashlib.sha256(img_bytes).hexdigest()
+
+
+def block_means(img, rows, columns):
+    # Average over a grid of blocks, in one pass over the pixels. Resizing with anti-aliasing gets very slow for
+    # tall pages, because the width of its filter grows with the height.
+    height, width = img.shape
+    row_edges = np.arange(rows) * height // rows
+    column_edges = np.arange(columns) * width // columns
+
+    sums = np.add.reduceat(np.add.reduceat(img, row_edges, axis=0, dtype=np.float64), column_edges, axis=1)
+    counts = np.outer(np.diff(np.append(row_edges, height)), np.diff(np.append(column_edges, width)))
+    return sums / np.maximum(counts, 1)
+
+
+def dhash(img):
+    # Grayscale without the alpha channel
+    if img.ndim == 3:
+        img = img[:, :, :3].mean(axis=2, dtype=np.float32)
+
+    # Difference hash: is each block brighter than its right neighbour on a 9x8 thumbnail
+    thumbnail = block_means(img.astype(np.float32, copy=False), 8, 9)
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).flatten()
+
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+
+    # Store as a signed 64-bit number so that it fits in a bigint column
+    if value >= 1 << (HASH_BITS - 1):
+        value -= 1 << HASH_BITS
+
+    return value
+
+
+def hamming_distance(hash1, hash2):
+    return bin((hash1 ^ hash2) & ((1 << HASH_BITS) - 1)).count('1')
+
+
+def estimate_image_score(digest1, hash1, digest2, hash2):
+    # Score without decoding if the images are identical, otherwise return None. Scoring perceptually close images
+    # from their hashes alone is optional: a 64-bit hash doesn't see a large block that differs.
+    if digest1 and digest1 == digest2:
+        return 1.0
+
+    if not settings.IMAGE_HASH_SHORTCUT or hash1 is None or hash2 is None:
+        return None
+
+    distance = hamming_distance(hash1, hash2)
+    if distance > settings.IMAGE_HASH_MAX_DISTANCE:
+        return None
+
+    return 1.0 - distance / HASH_BITS
@@ -0,0 +1,65 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import binascii
+
+from measurements.images.classify import classify_image, image_statistics
+from measurements.images.decode import decode_base64, decode_png
+from measurements.images.hashing import dhash, image_digest
+from measurements.images.store import screenshot_store
+
+
+def get_image_properties(img_bytes):
+    # Everything we want to know about a screenshot at ingest, as InstanceRunResult fields
+    properties = {
+        'image_digest': '',
+        'image_hash': None,
+        'image_entropy': None,
+        'image_dominance': None,
+        'image_class': '',
+    }
+
+    if not img_bytes:
+        return properties
+
+    try:
+        img = decode_png(img_bytes)
+    except (ValueError, OSError):
+        return properties
+
+    entropy, dominance = image_statistics(img)
+    properties.update({
+        'image_digest': image_digest(img_bytes),
+        'image_hash': dhash(img),
+        'image_entropy': entropy,
+        'image_dominance': dominance,
+        'image_class': classify_image(entropy, dominance),
+    })
+    return properties
+
+
+def store_screenshot(web_response):
+    # Move the screenshot from the web response to the screenshot store, only its digest stays behind.
+    # Returns the new web response and the properties of the screenshot.
+    img_b64 = web_response.get('image')
+    if not img_b64:
+        return web_response, get_image_properties(None)
+
+    try:
+        img_bytes = decode_base64(img_b64)
+    except (binascii.Error, ValueError):
+        return web_response, get_image_properties(None)
+
+    properties = get_image_properties(img_bytes)
+    if not properties['image_digest']:
+        # Not an image we understand, leave it where it is
+        return web_response, properties
+
+    screenshot_store.put(img_bytes)
+
+    web_response = dict(web_response)
+    del web_response['image']
+    web_response['image_digest'] = properties['image_digest']
+    return web_response, properties
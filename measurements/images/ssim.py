@@ -0,0 +1,117 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import numpy as np
+from scipy.ndimage import uniform_filter
+from skimage.util.dtype import dtype_range
+
+
+class BaselineSSIM:
+    """
+    SSIM against a fixed baseline image. The local statistics of the baseline are computed once, after which the
+    candidates of the same shape are scored one at a time. Uses the same parameters as
+    skimage.measure.compare_ssim(multichannel=True) so the scores are the same.
+    """
+
+    def __init__(self, baseline, data_range=None, win_size=7, k1=0.01, k2=0.03):
+        if data_range is None:
+            dmin, dmax = dtype_range[baseline.dtype.type]
+            data_range = dmax - dmin
+
+        self.shape = baseline.shape
+        self.win_size = win_size
+        self.c1 = (k1 * data_range) ** 2
+        self.c2 = (k2 * data_range) ** 2
+
+        # Sample covariance, like compare_ssim does by default
+        points = win_size ** 2
+        self.cov_norm = points / (points - 1)
+
+        # Single precision is plenty for 8-bit images, the filter itself sums in double precision
+        self.x = np.asarray(baseline, dtype=np.float32)
+        self.ux = self._filter(self.x)
+        self.ux2 = self.ux * self.ux
+        self.vx = self.cov_norm * (self._filter(self.x * self.x) - self.ux2)
+
+    def _filter(self, values):
+        # Only filter spatially, not across channels
+        size = [self.win_size] * 2 + [1] * (len(self.shape) - 2)
+        return uniform_filter(values, size=size)
+
+    def ssim_map(self, candidate):
+        # Calculated in place where possible, a tall screenshot takes hundreds of megabytes per intermediate array
+        y = np.asarray(candidate, dtype=np.float32)
+        uy = self._filter(y)
+
+        vy = self._filter(y * y)
+        vy -= uy * uy
+        vy *= self.cov_norm
+
+        vxy = self._filter(self.x * y)
+        del y
+        vxy -= self.ux * uy
+        vxy *= self.cov_norm
+
+        # (2 * ux * uy + c1) * (2 * vxy + c2)
+        numerator = self.ux * uy
+        numerator *= 2
+        numerator += self.c1
+        vxy *= 2
+        vxy += self.c2
+        numerator *= vxy
+        del vxy
+
+        # (ux ** 2 + uy ** 2 + c1) * (vx + vy + c2)
+        denominator = uy
+        denominator *= uy
+        denominator += self.ux2
+        denominator += self.c1
+        vy += self.vx
+        vy += self.c2
+        denominator *= vy
+        del vy
+
+        numerator /= denominator
+
+        # Ignore the borders where the window doesn't fit
+        pad = (self.win_size - 1) // 2
+        return numerator[pad:-pad, pad:-pad]
+
+    def score(self, candidates):
+        return [score for score, tiles in self.score_tiles(candidates, grid_size=0)]
+
+    def score_tiles(self, candidates, grid_size):
+        # Returns the score and a grid_size x grid_size array with the mean SSIM per tile for each candidate
+        for candidate in candidates:
+            if candidate.shape != self.shape:
+                raise ValueError('Candidate images must have the same dimensions as the baseline')
+
+        scores = []
+        for candidate in candidates:
+            ssim_map = self.ssim_map(candidate)
+            score = float(ssim_map.mean(dtype=np.float64))
+            scores.append((score, tile_means(ssim_map, grid_size) if grid_size else None))
+
+        return scores
+
+
+def tile_bounds(length, count):
+    # Tiles are at least one pixel, on small images neighbouring tiles overlap
+    for index in range(count):
+        start = min(index * length // count, length - 1)
+        end = max(start + 1, (index + 1) * length // count)
+        yield start, end
+
+
+def tile_means(ssim_map, grid_size):
+    if ssim_map.ndim == 3:
+        ssim_map = ssim_map.mean(axis=2)
+
+    tiles = np.empty((grid_size, grid_size), dtype=np.float64)
+    for row, (top, bottom) in enumerate(tile_bounds(ssim_map.shape[0], grid_size)):
+        for column, (left, right) in enumerate(tile_bounds(ssim_map.shape[1], grid_size)):
+            tiles[row, column] = ssim_map[top:bottom, left:right].mean()
+
+    return tiles
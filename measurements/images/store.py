@@ -0,0 +1,59 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import os
+import tempfile
+
+from django.conf import settings
+
+from measurements.images.hashing import image_digest
+
+
+class ScreenshotStore:
+    """
+    Content-addressed storage for screenshots. Each PNG is stored once under its SHA-256 digest, no matter how many
+    results have the same screenshot. Blobs are never modified, so they can be cached and shared freely.
+    """
+
+    def __init__(self, directory=None):
+        self._directory = directory
+
+    @property
+    def directory(self):
+        return self._directory or settings.SCREENSHOT_STORE_DIR
+
+    def get_path(self, digest):
+        # Spread the blobs over subdirectories so that no directory gets too big
+        return os.path.join(self.directory, digest[:2], digest[2:4], digest + '.png')
+
+    def exists(self, digest):
+        return os.path.exists(self.get_path(digest))
+
+    def put(self, img_bytes):
+        digest = image_digest(img_bytes)
+        path = self.get_path(digest)
+        if os.path.exists(path):
+            return digest
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        # Write to a temporary file and move it into place, so nobody ever sees a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(img_bytes)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+        return digest
+
+    def open(self, digest):
+        return open(self.get_path(digest), 'rb')
+
+
+screenshot_store = ScreenshotStore()
@@ -0,0 +1,31 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import math
+
+import numpy as np
+
+# Half precision is plenty for showing where a page differs, a 16x16 grid takes 512 bytes
+TILE_DTYPE = np.dtype('<f2')
+
+
+def pack_tiles(tiles):
+    if tiles is None:
+        return None
+
+    return np.asarray(tiles, dtype=TILE_DTYPE).tobytes()
+
+
+def unpack_tiles(data):
+    if not data:
+        return None
+
+    # The grid is square, so the size follows from the length
+    tiles = np.frombuffer(bytes(data), dtype=TILE_DTYPE)
+    grid_size = int(math.sqrt(tiles.size))
+    if grid_size * grid_size != tiles.size:
+        return None
+
+    return tiles.reshape(grid_size, grid_size)
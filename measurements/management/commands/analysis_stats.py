@@ -0,0 +1,94 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from django.core.management import BaseCommand
+
+from generic.stats import reset_counters
+from instances.sessions import get_session_stats
+from measurements.images import get_decision_stats
+from measurements.memo import get_memo_stats
+from measurements.tasks.delegate import get_delegation_stats
+from measurements.tasks.sweeper import get_sweep_stats
+from measurements.timing import get_timing_stats, reset_timing_stats
+from measurements.triggers import get_trigger_stats
+
+
+class Command(BaseCommand):
+    help = 'Show the counters collected by the analysis pipeline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after showing them')
+
+    def handle(self, *args, **options):
+        decisions = get_decision_stats()
+        total = sum(decisions.values())
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Image comparison decisions:'))
+        for level, count in decisions.items():
+            self.stdout.write('  {level:<12} {count:>10} ({percentage:.1f}%)'.format(
+                level=level,
+                count=count,
+                percentage=100 * count / (total or 1)
+            ))
+
+        triggers = get_trigger_stats()
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Analysis triggers:'))
+        for name, count in triggers.items():
+            self.stdout.write('  {name:<12} {count:>10}'.format(name=name, count=count))
+
+        memo = get_memo_stats()
+        lookups = sum(memo.values())
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Comparison memo:'))
+        for name, count in memo.items():
+            self.stdout.write('  {name:<12} {count:>10} ({percentage:.1f}%)'.format(
+                name=name,
+                count=count,
+                percentage=100 * count / (lookups or 1)
+            ))
+
+        sweeps = get_sweep_stats()
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Sweeper:'))
+        for name, count in sweeps.items():
+            self.stdout.write('  {name:<12} {count:>10}'.format(name=name, count=count))
+
+        sessions = get_session_stats()
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Trillian connections:'))
+        for name, count in sessions.items():
+            self.stdout.write('  {name:<12} {count:>10} ({percentage:.1f}%)'.format(
+                name=name,
+                count=count,
+                percentage=100 * count / (sessions['requests'] or 1)
+            ))
+
+        delegations = get_delegation_stats()
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Delegation:'))
+        for name, count in delegations.items():
+            self.stdout.write('  {name:<12} {count:>10}'.format(name=name, count=count))
+
+        timings = get_timing_stats()
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Analysis timings (ms):'))
+        for (task, stage), stats in timings.items():
+            if not stats['count']:
+                continue
+
+            self.stdout.write('  {name:<30} {count:>10} mean {mean:8.1f} p50 {p50:>6} p95 {p95:>6} p99 {p99:>6}'.format(
+                name='{}.{}'.format(task, stage),
+                **stats
+            ))
+
+        if options['reset']:
+            reset_counters(['image_compare.' + level for level in decisions])
+            reset_counters(['analysis_trigger.' + name for name in triggers])
+            reset_counters(['comparison_memo.' + name for name in memo])
+            reset_counters(['sweeper.' + name for name in sweeps])
+            reset_counters(['trillian_session.' + name for name in sessions])
+            reset_counters(['delegation.' + name for name in delegations])
+            reset_timing_stats()
@@ -0,0 +1,254 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+from statistics import mean, median
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.core.management import BaseCommand
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from instances.models import Marvin, Trillian
+from measurements.images import compare_images, decode_base64_image, get_image_properties, store_screenshot
+from measurements.images.decode import decode_base64
+from measurements.models import InstanceRun, InstanceRunResource, InstanceRunResult, TestRun
+from measurements.synthetic import degradations, encode_screenshot, make_resources, make_screenshot
+from measurements.tasks import analyse_instancerunresult, analyse_testrun_tree
+from measurements.utils import compare_base64_images, get_resource_properties, get_resource_rows
+
+# How each instance type of the synthetic test runs looks compared to the dual-stack baseline
+instance_types = {
+    'dual-stack': ('identical', 0.0),
+    'v4only': ('identical', 0.0),
+    'v6only': ('missing', 0.2),
+    'nat64': ('shifted', 0.05),
+}
+
+
+def size(value):
+    try:
+        width, height = value.split('x')
+        return int(width), int(height)
+    except ValueError:
+        raise argparse.ArgumentTypeError('{} is not a size like 1280x2000'.format(value))
+
+
+def measure(function, repeat, setup=None):
+    durations = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        function(*args)
+        durations.append(time.perf_counter() - start)
+
+    return {
+        'repeat': repeat,
+        'min': min(durations),
+        'median': median(durations),
+        'mean': mean(durations),
+        'max': max(durations),
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+                                       stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Time the stages of the analysis and the full test run pipeline on synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=size, nargs='+', default=[(1280, 1024), (1280, 4000)],
+                            help='Screenshot sizes, like 1280x2000')
+        parser.add_argument('--resources', type=int, nargs='+', default=[50, 500],
+                            help='Number of resources per result')
+        parser.add_argument('--instanceruns', type=int, default=4, help='Instance runs per synthetic test run')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of times to run each stage')
+        parser.add_argument('--skip-database', action='store_true',
+                            help="Only run the stages that don't need the database")
+        parser.add_argument('--memo', action='store_true',
+                            help='Let the pipeline use remembered comparisons from earlier runs')
+        parser.add_argument('--output', help='File to write the results to as JSON')
+        parser.add_argument('--compare', help='JSON file of an earlier run to compare the results with')
+
+    def handle(self, *args, **options):
+        self.results = {}
+
+        for width, height in options['sizes']:
+            self.run_image_stages(width, height, options['repeat'])
+
+        for count in options['resources']:
+            self.run_resource_stages(count, options['repeat'])
+
+        if not options['skip_database']:
+            width, height = options['sizes'][0]
+            memo_timeout = settings.COMPARISON_MEMO_TIMEOUT if options['memo'] else 0
+            with override_settings(COMPARISON_MEMO_TIMEOUT=memo_timeout):
+                self.run_pipeline(width, height, options['resources'][0], options['instanceruns'],
+                                  options['repeat'])
+
+        report = {
+            'commit': get_commit(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'image_compare_workers': settings.IMAGE_COMPARE_WORKERS,
+            'stages': self.results,
+        }
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+
+        previous = {}
+        if options['compare']:
+            with open(options['compare']) as compare_file:
+                previous = json.load(compare_file)['stages']
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Median time per stage:'))
+        for name, timing in self.results.items():
+            line = '  {name:<40} {median:10.2f} ms'.format(name=name, median=timing['median'] * 1000)
+            if name in previous:
+                line += ' {change:+7.1f}%'.format(
+                    change=100 * (timing['median'] / previous[name]['median'] - 1)
+                )
+            self.stdout.write(line)
+
+    def run_image_stages(self, width, height, repeat):
+        base = make_screenshot(width, height)
+        base_b64 = encode_screenshot(base)
+        decoded = decode_base64_image(base_b64)
+        label = '{}x{}'.format(width, height)
+
+        self.results['decode[{}]'.format(label)] = measure(lambda: decode_base64_image(base_b64), repeat)
+        self.results['properties[{}]'.format(label)] = measure(
+            lambda: get_image_properties(decode_base64(base_b64)), repeat
+        )
+
+        for name, degrade in degradations.items():
+            candidate = degrade(base)
+            candidate_b64 = encode_screenshot(candidate)
+            self.results['ssim[{},{}]'.format(label, name)] = measure(
+                lambda: compare_images(decoded, candidate), repeat
+            )
+            self.results['compare_base64[{},{}]'.format(label, name)] = measure(
+                lambda: compare_base64_images(base_b64, candidate_b64), repeat
+            )
+
+    def run_resource_stages(self, count, repeat):
+        resources = make_resources(count, fail_fraction=0.1)
+        self.results['resource_properties[{}]'.format(count)] = measure(
+            lambda: get_resource_properties(resources), repeat
+        )
+        self.results['resource_rows[{}]'.format(count)] = measure(lambda: get_resource_rows(resources), repeat)
+
+    def run_pipeline(self, width, height, resource_count, instancerun_count, repeat):
+        trillian, marvins = self.create_marvins()
+        try:
+            base = make_screenshot(width, height)
+            responses = {}
+            for instance_type, (degradation, fail_fraction) in instance_types.items():
+                responses[instance_type] = store_screenshot({
+                    'image': encode_screenshot(degradations[degradation](base)),
+                    'resources': make_resources(resource_count, fail_fraction),
+                })
+
+            def analyse_cascade(testrun):
+                # Without uWSGI the tasks run inline, each one triggers the next
+                for pk in InstanceRunResult.objects.filter(instancerun__testrun=testrun).values_list('pk', flat=True):
+                    analyse_instancerunresult(pk)
+
+            def analyse_tree(testrun):
+                analyse_testrun_tree(testrun.pk)
+
+            for mode, analyse in (('cascade', analyse_cascade), ('testrun', analyse_tree)):
+                testruns = []
+
+                def setup():
+                    testrun = self.create_testrun(trillian, marvins, responses, instancerun_count)
+                    testruns.append(testrun)
+                    return testrun,
+
+                with override_settings(ANALYSIS_MODE=mode):
+                    timing = measure(analyse, repeat, setup)
+
+                unanalysed = TestRun.objects.filter(pk__in=[testrun.pk for testrun in testruns], analysed=None)
+                if unanalysed.exists():
+                    self.stderr.write(self.style.ERROR('Not all test runs were analysed in {} mode'.format(mode)))
+
+                self.results['pipeline[{},{}x{},{}]'.format(mode, width, height, instancerun_count)] = timing
+                TestRun.objects.filter(pk__in=[testrun.pk for testrun in testruns]).delete()
+
+        finally:
+            TestRun.objects.filter(instanceruns__trillian=trillian).delete()
+            Marvin.objects.filter(trillian=trillian).delete()
+            trillian.delete()
+
+    def create_marvins(self):
+        now = timezone.now()
+        trillian, created = Trillian.objects.get_or_create(name='benchmark', defaults={
+            'hostname': 'benchmark.invalid',
+            'last_seen': now,
+            'is_alive': False,
+            'version': [0],
+            'location': Point(0, 0),
+        })
+
+        marvins = {}
+        for instance_type in instance_types:
+            marvins[instance_type], created = Marvin.objects.get_or_create(
+                trillian=trillian,
+                name='benchmark-{}'.format(instance_type),
+                defaults={
+                    'hostname': 'benchmark-{}.invalid'.format(instance_type),
+                    'type': 'benchmark',
+                    'version': [0],
+                    'browser_name': 'benchmark',
+                    'browser_version': [0],
+                    'instance_type': instance_type,
+                    'first_seen': now,
+                    'last_seen': now,
+                }
+            )
+
+        return trillian, marvins
+
+    def create_testrun(self, trillian, marvins, responses, instancerun_count):
+        # Bulk creation sends no signals, so nothing is delegated or analysed before we start timing
+        now = timezone.now()
+        testrun = TestRun.objects.bulk_create([
+            TestRun(url='https://benchmark.invalid/', requested=now, started=now, finished=now, is_public=False)
+        ])[0]
+        instanceruns = InstanceRun.objects.bulk_create([
+            InstanceRun(testrun=testrun, trillian=trillian, started=now, finished=now)
+            for _ in range(instancerun_count)
+        ])
+
+        results = InstanceRunResult.objects.bulk_create([
+            InstanceRunResult(instancerun=instancerun, marvin=marvin, when=now, ping_response={},
+                              web_response=responses[instance_type][0],
+                              **responses[instance_type][1],
+                              **get_resource_properties(responses[instance_type][0]['resources']))
+            for instancerun in instanceruns
+            for instance_type, marvin in marvins.items()
+        ])
+
+        InstanceRunResource.objects.bulk_create([
+            InstanceRunResource(result=result, **row)
+            for result in results
+            for row in get_resource_rows(result.web_response['resources'])
+        ], batch_size=1000)
+
+        return testrun
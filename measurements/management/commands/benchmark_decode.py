@@ -0,0 +1,79 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import base64
+import io
+import multiprocessing
+import resource
+import time
+
+import numpy as np
+import skimage.io
+from django.core.management import BaseCommand
+
+from measurements.images import decode_base64_image
+from measurements.synthetic import encode_screenshot, make_screenshot
+
+
+def legacy_decode(img_b64):
+    # How screenshots used to be decoded
+    img_bytes = base64.decodebytes(img_b64.encode('ascii'))
+    return skimage.io.imread(io.BytesIO(img_bytes))
+
+
+methods = {
+    'legacy': legacy_decode,
+    'streaming': decode_base64_image,
+}
+
+
+def measure(method, img_b64, repeat, connection):
+    # Runs in a fresh process, so the peak RSS only reflects this method
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        img = methods[method](img_b64)
+        del img
+    duration = time.perf_counter() - start
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    connection.send((duration / repeat, (peak_rss - start_rss) * 1024))
+    connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Compare the time and peak memory of the legacy and streaming screenshot decoders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--width', type=int, default=1280, help='Width of the synthetic screenshot')
+        parser.add_argument('--height', type=int, default=8000, help='Height of the synthetic screenshot')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of times to decode the screenshot')
+
+    def handle(self, *args, **options):
+        img_b64 = encode_screenshot(make_screenshot(options['width'], options['height']))
+        self.stdout.write('Screenshot: {}x{}, {:.1f} MB base64, {:.1f} MB decoded'.format(
+            options['width'], options['height'],
+            len(img_b64) / 1024 / 1024,
+            options['width'] * options['height'] * 3 / 1024 / 1024
+        ))
+
+        context = multiprocessing.get_context('fork')
+        for method in methods:
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=measure, args=(method, img_b64, options['repeat'], sender))
+            process.start()
+            duration, peak_rss = receiver.recv()
+            process.join()
+
+            self.stdout.write('  {method:<10} {duration:8.1f} ms/image {peak_rss:8.1f} MB peak RSS increase'.format(
+                method=method,
+                duration=duration * 1000,
+                peak_rss=peak_rss / 1024 / 1024
+            ))
+
+        # Only decode in this process after measuring, freed memory would hide the allocations of the children
+        if not np.array_equal(legacy_decode(img_b64), decode_base64_image(img_b64)):
+            self.stderr.write(self.style.ERROR('The decoders return different images'))
@@ -0,0 +1,138 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import io
+import os
+import time
+from contextlib import redirect_stdout
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.core.management import BaseCommand
+from django.test.utils import override_settings
+from django.utils import timezone
+from uwsgi_tasks import RetryTaskException
+
+from instances.models import Trillian
+from instances.sessions import get_session_stats
+from measurements.mock_trillian import MockTrillian
+from measurements.models import InstanceRun, TestRun
+from measurements.tasks.delegate import delegate_batch, delegate_to_trillian, get_unsupported_key
+
+
+class Command(BaseCommand):
+    help = 'Push synthetic instance runs to a local mock Trillian, one by one and in batches. The mock needs a ' \
+           'certificate for localhost, for example: openssl req -x509 -newkey rsa:2048 -nodes -days 1 ' \
+           '-keyout key.pem -out cert.pem -subj /CN=localhost -addext subjectAltName=DNS:localhost'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--certfile', required=True, help='Certificate of the mock Trillian')
+        parser.add_argument('--keyfile', required=True, help='Private key of the mock Trillian')
+        parser.add_argument('--instanceruns', type=int, default=200, help='Number of instance runs to push')
+        parser.add_argument('--batch-size', type=int, default=settings.DELEGATION_BATCH_SIZE,
+                            help='Number of instance runs per batch')
+        parser.add_argument('--failure-rate', type=float, default=0.1,
+                            help='Fraction of the instance runs that the mock Trillian refuses')
+        parser.add_argument('--latency', type=float, default=10, help='Milliseconds the mock takes per request')
+        parser.add_argument('--no-batch-endpoint', action='store_true',
+                            help="Let the mock Trillian behave like one that doesn't support batches")
+
+    def handle(self, *args, **options):
+        # Make the sessions trust the certificate of the mock
+        os.environ['REQUESTS_CA_BUNDLE'] = options['certfile']
+
+        mock = MockTrillian(options['certfile'], options['keyfile'], token='benchmark',
+                            failure_rate=options['failure_rate'], latency=options['latency'] / 1000,
+                            batches=not options['no_batch_endpoint'])
+        mock.start()
+
+        trillian = Trillian.objects.create(
+            name='benchmark-delegation',
+            hostname=mock.hostname,
+            token=mock.token,
+            last_seen=timezone.now(),
+            version=[0],
+            location=Point(0, 0),
+        )
+
+        try:
+            self.stdout.write(self.style.MIGRATE_HEADING('Pushing {} instance runs:'.format(options['instanceruns'])))
+            for mode in ('single', 'batch'):
+                with override_settings(DELEGATION_BATCH_SIZE=options['batch_size']):
+                    self.run_mode(mode, trillian, mock, options['instanceruns'])
+
+        finally:
+            TestRun.objects.filter(instanceruns__trillian=trillian).delete()
+            cache.delete(get_unsupported_key(trillian.pk))
+            trillian.delete()
+            mock.stop()
+
+    def run_mode(self, mode, trillian, mock, count):
+        pks = self.create_instanceruns(trillian, count)
+        mock.reset()
+        sessions = get_session_stats()
+
+        # The tasks print a line for each instance run
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            if mode == 'batch':
+                accepted, rejected = delegate_batch(trillian, 'interactive')
+                fallback = [run.pk for run in rejected]
+            else:
+                accepted, fallback = 0, pks
+
+            for pk in fallback:
+                try:
+                    delegate_to_trillian(pk)
+                except RetryTaskException:
+                    # In the spooler this would be retried later
+                    pass
+
+            duration = time.perf_counter() - start
+
+        delegated = InstanceRun.objects.filter(pk__in=pks).exclude(trillian_url='').count()
+        duplicates = sum(1 for times in mock.created.values() if times > 1)
+        handshakes = get_session_stats()['handshakes'] - sessions['handshakes']
+
+        self.stdout.write(
+            '  {mode:<7} {duration:8.2f} s {rate:8.1f} runs/s, {requests} requests ({batches} batches, '
+            '{handshakes} handshakes), {accepted} accepted in batches, {delegated} delegated, '
+            '{pending} left for retries'.format(
+                mode=mode,
+                duration=duration,
+                rate=count / duration,
+                requests=mock.counters['requests'],
+                batches=mock.counters['batches'],
+                handshakes=handshakes,
+                accepted=accepted,
+                delegated=delegated,
+                pending=count - delegated,
+            )
+        )
+
+        # Every instance run the mock accepted must be recorded exactly once
+        if duplicates:
+            self.stderr.write(self.style.ERROR('  {} instance runs were pushed more than once'.format(duplicates)))
+        if len(mock.created) != delegated:
+            self.stderr.write(self.style.ERROR('  The mock accepted {} instance runs but {} have a Trillian URL'.format(
+                len(mock.created), delegated
+            )))
+
+        TestRun.objects.filter(pk__in=InstanceRun.objects.filter(pk__in=pks).values('testrun_id')).delete()
+
+    def create_instanceruns(self, trillian, count):
+        # Bulk creation sends no signals, so nothing is pushed before we start timing
+        now = timezone.now()
+        testruns = TestRun.objects.bulk_create([
+            TestRun(url='https://benchmark.invalid/{}/'.format(nr), requested=now, is_public=False)
+            for nr in range(count)
+        ])
+        instanceruns = InstanceRun.objects.bulk_create([
+            InstanceRun(testrun=testrun, trillian=trillian)
+            for testrun in testruns
+        ])
+
+        return [instancerun.pk for instancerun in instanceruns]
@@ -0,0 +1,28 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from django.core.management import BaseCommand
+
+from measurements.models import InstanceRunResource, InstanceRunResult
+from measurements.utils import get_resource_rows
+
+
+class Command(BaseCommand):
+    help = 'Fill the resource table for results that were stored before it existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Number of results to load at once')
+
+    def handle(self, *args, **options):
+        queryset = InstanceRunResult.objects.filter(resources=None).only('pk', 'web_response').order_by('pk')
+        loaded = 0
+
+        for result in queryset.iterator(chunk_size=options['batch_size']):
+            resources = [InstanceRunResource(result=result, **row)
+                         for row in get_resource_rows(result.web_response.get('resources'))]
+            InstanceRunResource.objects.bulk_create(resources, batch_size=1000)
+            loaded += len(resources)
+
+        self.stdout.write('Loaded {} resources'.format(loaded))
@@ -0,0 +1,187 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import argparse
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, time
+
+from django.core.management import BaseCommand
+from django.db.models import Avg, Q
+from django.db.transaction import atomic
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from generic.utils import bulk_update, claim_all, release
+from measurements.models import InstanceRun, InstanceRunResult, TestRun
+from measurements.scoring import ANALYSIS_VERSION, score_result_groups
+
+SCORE_FIELDS = ['image_score', 'resource_score', 'overall_score']
+
+
+def moment(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        date = parse_date(value)
+        if date is None:
+            raise argparse.ArgumentTypeError('{} is not a valid date or date and time'.format(value))
+
+        parsed = datetime.combine(date, time.min)
+
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+
+    return parsed
+
+
+def average_scores(queryset, *group_by):
+    return queryset.values(*group_by).annotate(**{field: Avg(field) for field in SCORE_FIELDS})
+
+
+def update_instanceruns(pks):
+    # Only runs that have been analysed before, the others still get their scores from the normal analysis
+    instanceruns = InstanceRun.objects.filter(pk__in=pks).exclude(analysed=None).in_bulk()
+    averages = average_scores(InstanceRunResult.objects.filter(instancerun_id__in=instanceruns),
+                              'instancerun_id')
+    for average in averages:
+        instancerun = instanceruns[average['instancerun_id']]
+        for field in SCORE_FIELDS:
+            setattr(instancerun, field, average[field])
+
+    bulk_update(instanceruns.values(), SCORE_FIELDS)
+
+
+def update_testruns(pks):
+    for testrun in TestRun.objects.filter(pk__in=pks).exclude(analysed=None):
+        testrun.recount_scores()
+
+
+class Command(BaseCommand):
+    help = 'Score analysed results again, by default only the ones scored by an older version of the analysis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=moment, help='Only results from this date and time on')
+        parser.add_argument('--until', type=moment, help='Only results from before this date and time')
+        parser.add_argument('--url', help='Only results of test runs whose URL contains this text')
+        parser.add_argument('--marvin', action='append', help='Only results of the Marvin with this name, '
+                                                              'can be given multiple times')
+        parser.add_argument('--all', action='store_true', help='Also score results that are up to date')
+        parser.add_argument('--batch-size', type=int, default=20,
+                            help='Number of instance runs to score at once, their comparisons run in parallel in '
+                                 'the comparison engine')
+        parser.add_argument('--checkpoint', help='File to keep track of progress, an interrupted run can be '
+                                                 'resumed by giving the same file again')
+
+    def load_checkpoint(self, filename, selection):
+        if not filename or not os.path.exists(filename):
+            return 0
+
+        with open(filename) as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+
+        if checkpoint['selection'] != selection:
+            self.stderr.write('Checkpoint {} is for a different selection of results, starting over'.format(
+                filename
+            ))
+            return 0
+
+        self.stdout.write('Resuming after instance run {}'.format(checkpoint['instancerun']))
+        return checkpoint['instancerun']
+
+    def save_checkpoint(self, filename, selection, instancerun_id):
+        if not filename:
+            return
+
+        # Write to a temporary file first, so an interruption never leaves a broken checkpoint
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'w') as checkpoint_file:
+            json.dump({'selection': selection, 'instancerun': instancerun_id}, checkpoint_file)
+
+        os.replace(tmp_filename, filename)
+
+    def handle(self, *args, **options):
+        # Only results that have been analysed before, new ones are picked up by the normal analysis
+        queryset = InstanceRunResult.objects.exclude(analysed=None)
+
+        if not options['all']:
+            queryset = queryset.filter(Q(analysis_version=None) | Q(analysis_version__lt=ANALYSIS_VERSION))
+        if options['since']:
+            queryset = queryset.filter(when__gte=options['since'])
+        if options['until']:
+            queryset = queryset.filter(when__lt=options['until'])
+        if options['url']:
+            queryset = queryset.filter(instancerun__testrun__url__icontains=options['url'])
+        if options['marvin']:
+            queryset = queryset.filter(marvin__name__in=options['marvin'])
+
+        selection = {
+            'since': options['since'] and options['since'].isoformat(),
+            'until': options['until'] and options['until'].isoformat(),
+            'url': options['url'],
+            'marvin': options['marvin'],
+            'all': options['all'],
+            'version': ANALYSIS_VERSION,
+        }
+        last_instancerun = self.load_checkpoint(options['checkpoint'], selection)
+
+        # Results are scored per instance run, because that is where their baseline comes from
+        instancerun_ids = sorted(queryset
+                                 .filter(instancerun_id__gt=last_instancerun)
+                                 .values_list('instancerun_id', flat=True)
+                                 .distinct())
+        self.stdout.write('Scoring results of {} instance runs with analysis version {}'.format(
+            len(instancerun_ids), ANALYSIS_VERSION
+        ))
+
+        rescored = 0
+        for start in range(0, len(instancerun_ids), options['batch_size']):
+            batch = instancerun_ids[start:start + options['batch_size']]
+
+            # Claimed like the analysis tasks do, results that a task is analysing right now get the current version
+            # from that task. The baselines are only read.
+            selected = set(queryset.filter(instancerun_id__in=batch).values_list('pk', flat=True))
+            claimed = claim_all(InstanceRunResult.objects
+                                .filter(pk__in=selected)
+                                .select_related('marvin', 'instancerun')
+                                .order_by('pk'))
+            try:
+                claimed_pks = {result.pk for result in claimed}
+                results = claimed + list(InstanceRunResult.objects
+                                         .filter(instancerun_id__in=batch)
+                                         .exclude(pk__in=claimed_pks)
+                                         .select_related('marvin', 'instancerun')
+                                         .order_by('pk'))
+
+                results_per_run = defaultdict(list)
+                for result in results:
+                    results_per_run[result.instancerun_id].append(result)
+
+                groups = []
+                for run_results in results_per_run.values():
+                    baseline = [result for result in run_results if result.marvin.instance_type == 'dual-stack']
+                    groups.append(([result for result in run_results if result.pk in claimed_pks], baseline))
+
+                scored = [result for group in score_result_groups(groups) for result in group]
+
+                # Keep the original analysis timestamp, only the scores change
+                with atomic():
+                    bulk_update(scored, ['image_score', 'image_feedback', 'image_tiles', 'resource_score',
+                                         'overall_score', 'analysis_version'])
+
+                    update_instanceruns(batch)
+                    update_testruns({result.instancerun.testrun_id for result in results})
+
+            finally:
+                release(claimed)
+
+            rescored += len(scored)
+            self.save_checkpoint(options['checkpoint'], selection, batch[-1])
+            self.stdout.write('  {} results scored, up to instance run {}'.format(rescored, batch[-1]))
+
+        if options['checkpoint'] and os.path.exists(options['checkpoint']):
+            os.remove(options['checkpoint'])
+
+        self.stdout.write('Scored {} results'.format(rescored))
@@ -0,0 +1,35 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from django.core.management import BaseCommand
+
+from measurements.images import store_screenshot
+from measurements.models import InstanceRunResult
+
+
+class Command(BaseCommand):
+    help = 'Move screenshots of old results from the database to the screenshot store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Number of results to load at once')
+
+    def handle(self, *args, **options):
+        queryset = InstanceRunResult.objects.filter(web_response__has_key='image').order_by('pk')
+        moved = 0
+
+        # Only load the IDs up front, the screenshots are big
+        pks = list(queryset.values_list('pk', flat=True))
+        for start in range(0, len(pks), options['batch_size']):
+            for result in InstanceRunResult.objects.filter(pk__in=pks[start:start + options['batch_size']]):
+                web_response, properties = store_screenshot(result.web_response)
+                if 'image' in web_response:
+                    self.stderr.write('Result {}: screenshot could not be decoded, leaving it'.format(result.pk))
+                    continue
+
+                # Update directly, this is not a change that needs signals or new analysis
+                InstanceRunResult.objects.filter(pk=result.pk).update(web_response=web_response, **properties)
+                moved += 1
+
+        self.stdout.write('Moved {} screenshots to the store'.format(moved))
@@ -0,0 +1,64 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+from measurements.models import InstanceRunResult
+from measurements.tasks import analyse_instancerunresult
+
+
+def run_task(pk):
+    # Each thread has its own database connection, like separate spoolers
+    start = time.perf_counter()
+    try:
+        analyse_instancerunresult(pk)
+    finally:
+        connection.close()
+
+    return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = 'Run many duplicate analysis tasks for the same results at the same time and show how long they take'
+
+    def add_arguments(self, parser):
+        parser.add_argument('instancerun', type=int, help='ID of the instance run whose results to analyse')
+        parser.add_argument('--duplicates', type=int, default=10, help='Number of tasks per result')
+        parser.add_argument('--threads', type=int, default=20, help='Number of tasks running at the same time')
+
+    def handle(self, *args, **options):
+        results = InstanceRunResult.objects.filter(instancerun_id=options['instancerun'])
+        pks = list(results.values_list('pk', flat=True))
+        if not pks:
+            raise CommandError('Instance run {} has no results'.format(options['instancerun']))
+
+        # Analyse again, without the signals that would start tasks of their own
+        results.update(analysed=None)
+
+        tasks = [pk for pk in pks for _ in range(options['duplicates'])]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            durations = sorted(executor.map(run_task, tasks))
+        total = time.perf_counter() - start
+
+        self.stdout.write('{tasks} tasks for {results} results in {total:.2f}s'.format(
+            tasks=len(tasks),
+            results=len(pks),
+            total=total
+        ))
+        self.stdout.write('Task duration: median {median:.3f}s, fastest {fastest:.3f}s, slowest {slowest:.3f}s'.format(
+            median=median(durations),
+            fastest=durations[0],
+            slowest=durations[-1]
+        ))
+
+        # With duplicates skipping claimed results the median is the time of a skipped task, not of an analysis
+        analysed = sum(1 for duration in durations if duration > median(durations) * 10)
+        self.stdout.write('Tasks that took more than 10x the median: {}'.format(analysed))
@@ -0,0 +1,65 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from generic.stats import get_counters, increment_counter
+
+KEY_PREFIX = 'comparison:'
+
+memo_counters = ('hits', 'misses')
+
+
+# The settings that change the outcome of a comparison
+COMPARISON_SETTINGS = ('IMAGE_COMPARE_MODE', 'IMAGE_PYRAMID_FACTORS', 'IMAGE_PYRAMID_ACCEPT', 'IMAGE_PYRAMID_REJECT',
+                       'IMAGE_ALIGN_MODE', 'IMAGE_TILE_GRID', 'IMAGE_HASH_SHORTCUT', 'IMAGE_HASH_MAX_DISTANCE')
+
+
+def get_settings_fingerprint():
+    values = repr([getattr(settings, name) for name in COMPARISON_SETTINGS])
+    return hashlib.sha1(values.encode('utf8')).hexdigest()[:12]
+
+
+def get_memo_key(version, baseline_digest, candidate_digest):
+    # Outcomes from before a change to the comparison settings aren't used
+    return '{prefix}{version}:{fingerprint}:{baseline}:{candidate}'.format(
+        prefix=KEY_PREFIX,
+        version=version,
+        fingerprint=get_settings_fingerprint(),
+        baseline=baseline_digest,
+        candidate=candidate_digest
+    )
+
+
+def get_comparisons(version, pairs) -> dict:
+    # Look up the (score, note, tiles) tuples of earlier comparisons of these (baseline, candidate) digest pairs.
+    # Screenshots are stored by digest, so the same pair of digests always gives the same outcome.
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+
+    keys = {get_memo_key(version, *pair): pair for pair in pairs}
+    found = cache.get_many(keys.keys())
+
+    if found:
+        increment_counter('comparison_memo.hits', len(found))
+    if len(found) < len(pairs):
+        increment_counter('comparison_memo.misses', len(pairs) - len(found))
+
+    return {keys[key]: value for key, value in found.items()}
+
+
+def store_comparisons(version, comparisons: dict):
+    if comparisons:
+        cache.set_many({get_memo_key(version, *pair): value for pair, value in comparisons.items()},
+                       timeout=settings.COMPARISON_MEMO_TIMEOUT)
+
+
+def get_memo_stats():
+    counters = get_counters(['comparison_memo.' + name for name in memo_counters])
+    return {name: counters['comparison_memo.' + name] for name in memo_counters}
@@ -0,0 +1,35 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('measurements', '0013_testrunaverage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instancerunresult',
+            name='image_digest',
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                max_length=64,
+                verbose_name='image digest'
+            ),
+        ),
+        migrations.AddField(
+            model_name='instancerunresult',
+            name='image_hash',
+            field=models.BigIntegerField(
+                blank=True,
+                db_index=True,
+                null=True,
+                verbose_name='image hash'
+            ),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('measurements', '0014_instancerunresult_image_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instancerunresult',
+            name='image_entropy',
+            field=models.FloatField(
+                blank=True,
+                null=True,
+                verbose_name='image entropy'
+            ),
+        ),
+        migrations.AddField(
+            model_name='instancerunresult',
+            name='image_dominance',
+            field=models.FloatField(
+                blank=True,
+                null=True,
+                verbose_name='image dominance'
+            ),
+        ),
+        migrations.AddField(
+            model_name='instancerunresult',
+            name='image_class',
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ('', 'Normal'),
+                    ('error', 'Error page'),
+                    ('blank', 'Blank page')
+                ],
+                db_index=True,
+                max_length=5,
+                verbose_name='image class'
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('measurements', '0015_instancerunresult_image_class'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instancerunresult',
+            name='image_tiles',
+            field=models.BinaryField(
+                blank=True,
+                null=True,
+                verbose_name='image tiles'
+            ),
+        ),
+    ]
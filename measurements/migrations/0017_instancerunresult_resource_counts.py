@@ -0,0 +1,86 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from collections import defaultdict
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+# A copy of measurements.utils.get_resource_properties as it was when this migration was written
+def get_resource_properties(resources):
+    stats = defaultdict(lambda: {
+        'ok': 0,
+        'fail': 0
+    })
+
+    try:
+        for resource in resources or []:
+            resource_type = resource['request']['resource_type']
+            category = resource['success'] and 'ok' or 'fail'
+            stats[resource_type][category] += 1
+            stats['total'][category] += 1
+    except (KeyError, TypeError):
+        return {
+            'resources_ok': None,
+            'resources_fail': None,
+            'resource_stats': {},
+        }
+
+    total = stats.pop('total', {'ok': 0, 'fail': 0})
+    return {
+        'resources_ok': total['ok'],
+        'resources_fail': total['fail'],
+        'resource_stats': {resource_type: dict(counts) for resource_type, counts in stats.items()},
+    }
+
+
+def count_resources(apps, schema_editor):
+    InstanceRunResult = apps.get_model('measurements', 'InstanceRunResult')
+
+    # Results are updated one by one to keep memory use low, the resource lists can be long
+    queryset = InstanceRunResult.objects.filter(resources_ok=None).only('pk', 'web_response')
+    for result in queryset.iterator(chunk_size=100):
+        properties = get_resource_properties(result.web_response.get('resources'))
+        InstanceRunResult.objects.filter(pk=result.pk).update(**properties)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('measurements', '0016_instancerunresult_image_tiles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instancerunresult',
+            name='resources_ok',
+            field=models.PositiveIntegerField(
+                blank=True,
+                db_index=True,
+                null=True,
+                verbose_name='resources OK'
+            ),
+        ),
+        migrations.AddField(
+            model_name='instancerunresult',
+            name='resources_fail',
+            field=models.PositiveIntegerField(
+                blank=True,
+                db_index=True,
+                null=True,
+                verbose_name='resources failed'
+            ),
+        ),
+        migrations.AddField(
+            model_name='instancerunresult',
+            name='resource_stats',
+            field=django.contrib.postgres.fields.jsonb.JSONField(
+                blank=True,
+                default=dict,
+                verbose_name='resource statistics'
+            ),
+        ),
+        migrations.RunPython(count_resources, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('measurements', '0017_instancerunresult_resource_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstanceRunResource',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name='ID')
+                 ),
+                ('url', models.TextField(
+                    verbose_name='URL')
+                 ),
+                ('host', models.CharField(
+                    blank=True,
+                    db_index=True,
+                    max_length=255,
+                    verbose_name='host')
+                 ),
+                ('resource_type', models.CharField(
+                    blank=True,
+                    db_index=True,
+                    max_length=50,
+                    verbose_name='resource type')
+                 ),
+                ('success', models.BooleanField(
+                    db_index=True,
+                    verbose_name='success')
+                 ),
+                ('status', models.PositiveSmallIntegerField(
+                    blank=True,
+                    null=True,
+                    verbose_name='status')
+                 ),
+                ('result', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='resources',
+                    to='measurements.InstanceRunResult',
+                    verbose_name='instance run result')
+                 ),
+            ],
+            options={
+                'verbose_name': 'instance run resource',
+                'verbose_name_plural': 'instance run resources',
+                'ordering': ('result', 'id'),
+            },
+        ),
+    ]
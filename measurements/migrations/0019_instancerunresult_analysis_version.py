@@ -0,0 +1,25 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('measurements', '0018_instancerunresource'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instancerunresult',
+            name='analysis_version',
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                db_index=True,
+                null=True,
+                verbose_name='analysis version'
+            ),
+        ),
+    ]
@@ -0,0 +1,114 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+score_fields = ('image_score', 'resource_score', 'overall_score')
+
+
+def count_scores(apps, schema_editor):
+    TestRun = apps.get_model('measurements', 'TestRun')
+    TestRunAverage = apps.get_model('measurements', 'TestRunAverage')
+    InstanceRun = apps.get_model('measurements', 'InstanceRun')
+    InstanceRunResult = apps.get_model('measurements', 'InstanceRunResult')
+
+    # The means are already there, only the totals they are calculated from are new
+    totals = InstanceRun.objects \
+        .exclude(analysed=None) \
+        .exclude(overall_score=None) \
+        .values('testrun_id') \
+        .annotate(count=Count('pk'), **{field: Sum(field) for field in score_fields})
+    for total in totals.iterator():
+        TestRun.objects.filter(pk=total['testrun_id']).update(
+            score_count=total['count'],
+            **{field + '_sum': total[field] for field in score_fields}
+        )
+
+    totals = InstanceRunResult.objects \
+        .exclude(instancerun__analysed=None) \
+        .exclude(overall_score=None) \
+        .values('instancerun__testrun_id', 'marvin__instance_type') \
+        .annotate(count=Count('pk'), **{field: Sum(field) for field in score_fields})
+    for total in totals.iterator():
+        TestRunAverage.objects.filter(testrun_id=total['instancerun__testrun_id'],
+                                      instance_type=total['marvin__instance_type']).update(
+            score_count=total['count'],
+            **{field + '_sum': total[field] for field in score_fields}
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('measurements', '0019_instancerunresult_analysis_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testrun',
+            name='score_count',
+            field=models.PositiveIntegerField(
+                default=0,
+                verbose_name='scored instance runs'
+            ),
+        ),
+        migrations.AddField(
+            model_name='testrun',
+            name='image_score_sum',
+            field=models.FloatField(
+                default=0,
+                verbose_name='image score sum'
+            ),
+        ),
+        migrations.AddField(
+            model_name='testrun',
+            name='resource_score_sum',
+            field=models.FloatField(
+                default=0,
+                verbose_name='resource score sum'
+            ),
+        ),
+        migrations.AddField(
+            model_name='testrun',
+            name='overall_score_sum',
+            field=models.FloatField(
+                default=0,
+                verbose_name='overall score sum'
+            ),
+        ),
+        migrations.AddField(
+            model_name='testrunaverage',
+            name='score_count',
+            field=models.PositiveIntegerField(
+                default=0,
+                verbose_name='scored results'
+            ),
+        ),
+        migrations.AddField(
+            model_name='testrunaverage',
+            name='image_score_sum',
+            field=models.FloatField(
+                default=0,
+                verbose_name='image score sum'
+            ),
+        ),
+        migrations.AddField(
+            model_name='testrunaverage',
+            name='resource_score_sum',
+            field=models.FloatField(
+                default=0,
+                verbose_name='resource score sum'
+            ),
+        ),
+        migrations.AddField(
+            model_name='testrunaverage',
+            name='overall_score_sum',
+            field=models.FloatField(
+                default=0,
+                verbose_name='overall score sum'
+            ),
+        ),
+        migrations.RunPython(count_scores, migrations.RunPython.noop),
+    ]
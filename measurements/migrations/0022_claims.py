@@ -0,0 +1,69 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('measurements', '0021_instancerunresult_analysis_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testrun',
+            name='claimed_at',
+            field=models.DateTimeField(
+                blank=True,
+                null=True,
+                verbose_name='claimed at'
+            ),
+        ),
+        migrations.AddField(
+            model_name='testrun',
+            name='claimed_by',
+            field=models.CharField(
+                blank=True,
+                max_length=100,
+                verbose_name='claimed by'
+            ),
+        ),
+        migrations.AddField(
+            model_name='instancerun',
+            name='claimed_at',
+            field=models.DateTimeField(
+                blank=True,
+                null=True,
+                verbose_name='claimed at'
+            ),
+        ),
+        migrations.AddField(
+            model_name='instancerun',
+            name='claimed_by',
+            field=models.CharField(
+                blank=True,
+                max_length=100,
+                verbose_name='claimed by'
+            ),
+        ),
+        migrations.AddField(
+            model_name='instancerunresult',
+            name='claimed_at',
+            field=models.DateTimeField(
+                blank=True,
+                null=True,
+                verbose_name='claimed at'
+            ),
+        ),
+        migrations.AddField(
+            model_name='instancerunresult',
+            name='claimed_by',
+            field=models.CharField(
+                blank=True,
+                max_length=100,
+                verbose_name='claimed by'
+            ),
+        ),
+    ]
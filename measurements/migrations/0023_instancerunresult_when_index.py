@@ -0,0 +1,23 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('measurements', '0022_claims'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='instancerunresult',
+            name='when',
+            field=models.DateTimeField(
+                db_index=True,
+                verbose_name='when'
+            ),
+        ),
+    ]
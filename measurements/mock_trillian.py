@@ -0,0 +1,138 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import json
+import random
+import ssl
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class MockTrillianHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data=None):
+        body = json.dumps(data).encode('utf8') if data is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length).decode('utf8'))
+
+    def handle_request(self):
+        trillian = self.server.trillian
+        trillian.count('requests')
+        if self.headers.get('Authorization') != 'Token {}'.format(trillian.token):
+            return self.send_json(401, {'detail': 'Invalid token'})
+
+        if trillian.latency:
+            time.sleep(trillian.latency)
+
+        if self.command == 'GET' and self.path == '/api/v1/info/':
+            return self.send_json(200, {'version': [0, 0, 1]})
+
+        if self.command == 'POST' and self.path == '/api/v1/instanceruns/':
+            if trillian.should_fail():
+                return self.send_json(503, {'detail': 'Overloaded'})
+
+            return self.send_json(201, trillian.create(self.read_json()))
+
+        if self.command == 'POST' and self.path == '/api/v1/instanceruns/batch/' and trillian.batches:
+            trillian.count('batches')
+            results = []
+            for item in self.read_json()['instanceruns']:
+                if trillian.should_fail():
+                    results.append({'status': 503, 'detail': 'Overloaded'})
+                else:
+                    results.append(dict(status=201, **trillian.create(item)))
+
+            return self.send_json(200, {'results': results})
+
+        if self.command == 'DELETE' and self.path.startswith('/api/v1/instanceruns/'):
+            return self.send_json(204)
+
+        self.send_json(404, {'detail': 'Not found'})
+
+    do_GET = handle_request
+    do_POST = handle_request
+    do_DELETE = handle_request
+
+
+class MockTrillianServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing their keep-alive connections are no reason for a traceback
+        if not issubclass(sys.exc_info()[0], OSError):
+            super().handle_error(request, client_address)
+
+
+class MockTrillian:
+    """
+    A local stand-in for the API of a Trillian, to test delegation against. A fraction of the instance runs it gets
+    is refused, to see how partial failures are handled.
+    """
+
+    def __init__(self, certfile, keyfile, token, failure_rate=0.0, latency=0.0, batches=True, seed=0):
+        self.token = token
+        self.failure_rate = failure_rate
+        self.latency = latency
+        self.batches = batches
+
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.counters = Counter()
+        self.created = Counter()
+
+        self.server = MockTrillianServer(('127.0.0.1', 0), MockTrillianHandler)
+        self.server.trillian = self
+
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def hostname(self):
+        return 'localhost:{}'.format(self.server.server_port)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def should_fail(self):
+        with self.lock:
+            return self.random.random() < self.failure_rate
+
+    def create(self, item):
+        with self.lock:
+            self.created[item['callback_url']] += 1
+            number = sum(self.created.values())
+
+        return {'_url': 'https://{}/api/v1/instanceruns/{}/'.format(self.hostname, number)}
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.created.clear()
@@ -3,21 +3,31 @@
 #  3-Clause License. Please see the LICENSE file in the project root directory.
 # ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
 
+import base64
 import datetime
+import io
 import logging
+from functools import partial
 
 from django.conf import settings
 from django.contrib.gis.db import models
 from django.contrib.postgres.fields import ArrayField, JSONField
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.expressions import ExpressionWrapper, RawSQL
 from django.utils import timezone
 from django.utils.datetime_safe import date
 from django.utils.translation import gettext_lazy as _, gettext_noop
 from model_utils import FieldTracker
 
-from generic.utils import retry_qs
+from generic.models import ClaimableModel
+from generic.tasks import get_lane, spool
 from instances.models import Marvin, Trillian, instance_type_choices
-from measurements.tasks import analyse_instancerun, analyse_instancerunresult, analyse_testrun
+from measurements.images import image_class_choices, screenshot_store, unpack_tiles
+from measurements.tasks import analyse_instancerun, analyse_instancerunresult, analyse_testrun, analyse_testrun_tree
 from measurements.tasks.cleanup import remove_from_trillian
+from measurements.triggers import trigger_task
+from measurements.utils import get_resource_stats
 
 severities = (
     (logging.CRITICAL, _('Critical')),
@@ -27,6 +37,33 @@ severities = (
     (logging.DEBUG, _('Debug')),
 )
 
+score_fields = ('image_score', 'resource_score', 'overall_score')
+
+
+def add_to_running_scores(sums, count):
+    # Update expressions that add to the running sums and recalculate the means in the same statement, so
+    # concurrent updates can't get lost. The right hand sides see the values from before the update.
+    updates = {
+        'score_count': F('score_count') + count,
+    }
+    for field in score_fields:
+        updates[field + '_sum'] = F(field + '_sum') + (sums[field] or 0)
+        updates[field] = ExpressionWrapper((F(field + '_sum') + (sums[field] or 0)) / (F('score_count') + count),
+                                           output_field=models.FloatField())
+
+    return updates
+
+
+def get_running_scores(sums, count):
+    values = {
+        'score_count': count,
+    }
+    for field in score_fields:
+        values[field + '_sum'] = sums[field] or 0
+        values[field] = sums[field] / count if count else None
+
+    return values
+
 
 class Schedule(models.Model):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, verbose_name=_('owner'), on_delete=models.PROTECT)
@@ -87,7 +124,7 @@ class Schedule(models.Model):
     is_active = property(is_active)
 
 
-class TestRun(models.Model):
+class TestRun(ClaimableModel):
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, verbose_name=_('owner'), related_name='testruns', blank=True,
                               null=True, on_delete=models.PROTECT)
     schedule = models.ForeignKey(Schedule, verbose_name=_('schedule'), related_name='testruns', blank=True, null=True,
@@ -111,6 +148,12 @@ class TestRun(models.Model):
     overall_score = models.FloatField(_('overall score'), blank=True, null=True, db_index=True)
     overall_feedback = models.TextField(_('overall feedback'), blank=True)
 
+    # Running totals of the instance runs analysed so far, the scores above are their means
+    score_count = models.PositiveIntegerField(_('scored instance runs'), default=0)
+    image_score_sum = models.FloatField(_('image score sum'), default=0)
+    resource_score_sum = models.FloatField(_('resource score sum'), default=0)
+    overall_score_sum = models.FloatField(_('overall score sum'), default=0)
+
     tracker = FieldTracker(fields=['started', 'finished', 'analysed'])
 
     class Meta:
@@ -127,9 +170,70 @@ class TestRun(models.Model):
     trillians.short_description = _('trillians')
     trillians = property(trillians)
 
+    def lane(self):
+        # The spooler lane for the background work of this test run
+        return 'scheduled' if self.schedule_id else 'interactive'
+
+    lane.short_description = _('lane')
+    lane = property(lane)
+
     def trigger_analysis(self):
+        # Tasks are started after the commit, so they always see the data that triggered them, and only once
         if self.finished and not self.analysed:
-            analyse_testrun(self.pk)
+            if settings.ANALYSIS_MODE == 'testrun':
+                trigger_task(analyse_testrun_tree, self)
+            else:
+                trigger_task(analyse_testrun, self)
+
+    def add_scores(self, instancerun):
+        # Called when an instance run has been analysed, with this test run locked. The scores of the test run and
+        # its averages are always up to date, also while other instance runs are still busy.
+        if instancerun.overall_score is None:
+            return
+
+        TestRun.objects.filter(pk=self.pk).update(**add_to_running_scores({
+            field: getattr(instancerun, field) for field in score_fields
+        }, 1))
+
+        totals = instancerun.results \
+            .exclude(overall_score=None) \
+            .values('marvin__instance_type') \
+            .annotate(count=Count('pk'), **{field: Sum(field) for field in score_fields})
+
+        for total in totals:
+            average, created = TestRunAverage.objects.get_or_create(testrun=self,
+                                                                    instance_type=total['marvin__instance_type'])
+            TestRunAverage.objects.filter(pk=average.pk).update(**add_to_running_scores(total, total['count']))
+
+    def recount_scores(self):
+        # Start the running totals over from the instance runs that are analysed, for when analysis is reset. The test
+        # run is locked like in add_scores(), so an instance run that finishes in the meantime is either counted here
+        # or added afterwards, never lost.
+        with transaction.atomic():
+            TestRun.objects.select_for_update().filter(pk=self.pk).first()
+
+            totals = self.instanceruns \
+                .exclude(analysed=None) \
+                .exclude(overall_score=None) \
+                .aggregate(count=Count('pk'), **{field: Sum(field) for field in score_fields})
+
+            values = get_running_scores(totals, totals['count'])
+            for field, value in values.items():
+                setattr(self, field, value)
+
+            TestRun.objects.filter(pk=self.pk).update(**values)
+
+            totals = InstanceRunResult.objects \
+                .filter(instancerun__testrun=self) \
+                .exclude(instancerun__analysed=None) \
+                .exclude(overall_score=None) \
+                .values('marvin__instance_type') \
+                .annotate(count=Count('pk'), **{field: Sum(field) for field in score_fields})
+
+            self.averages.update(**get_running_scores({field: None for field in score_fields}, 0))
+            for total in totals:
+                TestRunAverage.objects.update_or_create(defaults=get_running_scores(total, total['count']),
+                                                        testrun=self, instance_type=total['marvin__instance_type'])
 
 
 class TestRunAverage(models.Model):
@@ -141,6 +245,12 @@ class TestRunAverage(models.Model):
     resource_score = models.FloatField(_('resource score'), blank=True, null=True, db_index=True)
     overall_score = models.FloatField(_('overall score'), blank=True, null=True, db_index=True)
 
+    # Running totals of the results analysed so far, the scores above are their means
+    score_count = models.PositiveIntegerField(_('scored results'), default=0)
+    image_score_sum = models.FloatField(_('image score sum'), default=0)
+    resource_score_sum = models.FloatField(_('resource score sum'), default=0)
+    overall_score_sum = models.FloatField(_('overall score sum'), default=0)
+
     class Meta:
         verbose_name = _('test run average')
         verbose_name_plural = _('test run averages')
@@ -179,7 +289,7 @@ class TestRunMessage(models.Model):
     is_public = property(is_public)
 
 
-class InstanceRun(models.Model):
+class InstanceRun(ClaimableModel):
     testrun = models.ForeignKey(TestRun, verbose_name=_('test run'), related_name='instanceruns',
                                 on_delete=models.CASCADE)
     trillian = models.ForeignKey(Trillian, verbose_name=_('Trillian'), on_delete=models.PROTECT)
@@ -243,27 +353,37 @@ class InstanceRun(models.Model):
     is_public.short_description = _('is public')
     is_public = property(is_public)
 
+    def lane(self):
+        return self.testrun.lane
+
+    lane.short_description = _('lane')
+    lane = property(lane)
+
     def get_baseline(self):
-        # We need a dual-stack result as the baseline
-        baseline = retry_qs(self.results.filter(marvin__instance_type='dual-stack'))
+        # We need a dual-stack result as the baseline, it can still arrive while the run isn't finished
+        baseline = self.results.filter(marvin__instance_type='dual-stack')
 
-        if not baseline.exists():
-            self.messages.update_or_create(
-                severity=logging.CRITICAL,
-                message=gettext_noop('No dual-stack result found, impossible to analyse')
-            )
+        if self.finished and not baseline.exists():
+            self.report_missing_baseline()
 
         return baseline
 
+    def report_missing_baseline(self):
+        self.messages.update_or_create(
+            severity=logging.CRITICAL,
+            message=gettext_noop('No dual-stack result found, impossible to analyse')
+        )
+
     def trigger_analysis(self):
         if self.finished:
-            if not self.analysed:
-                analyse_instancerun(self.pk)
+            if not self.analysed and settings.ANALYSIS_MODE != 'testrun':
+                trigger_task(analyse_instancerun, self)
             else:
+                # Either we're done or the test run analyses everything at once
                 self.testrun.trigger_analysis()
 
     def trigger_cleanup(self):
-        remove_from_trillian(self.pk)
+        transaction.on_commit(partial(spool, remove_from_trillian, get_lane('maintenance'), self.pk))
 
 
 class InstanceRunMessage(models.Model):
@@ -303,19 +423,54 @@ class InstanceRunMessage(models.Model):
     is_public = property(is_public)
 
 
-class InstanceRunResult(models.Model):
+class InstanceRunResultQuerySet(models.QuerySet):
+    def similar_images(self, image_hash, max_distance=0):
+        if image_hash is None:
+            return self.none()
+
+        # Number of bits that differ between the perceptual hashes
+        distance = RawSQL(
+            "length(replace((measurements_instancerunresult.image_hash # %s)::bit(64)::text, '0', ''))",
+            (image_hash,),
+            output_field=models.IntegerField()
+        )
+
+        if max_distance == 0:
+            # Let the database use the index
+            return self.filter(image_hash=image_hash).annotate(image_distance=distance)
+
+        return self.exclude(image_hash=None) \
+            .annotate(image_distance=distance) \
+            .filter(image_distance__lte=max_distance)
+
+
+class InstanceRunResult(ClaimableModel):
+    objects = InstanceRunResultQuerySet.as_manager()
+
     instancerun = models.ForeignKey(InstanceRun, verbose_name=_('instance run'), related_name='results',
                                     on_delete=models.CASCADE)
     marvin = models.ForeignKey(Marvin, verbose_name=_('Marvin'), on_delete=models.PROTECT)
 
-    when = models.DateTimeField(_('when'))
+    when = models.DateTimeField(_('when'), db_index=True)
     analysed = models.DateTimeField(_('analysed'), blank=True, null=True, db_index=True)
 
     ping_response = JSONField()
     web_response = JSONField()
 
+    image_digest = models.CharField(_('image digest'), max_length=64, blank=True, db_index=True)
+    image_hash = models.BigIntegerField(_('image hash'), blank=True, null=True, db_index=True)
+    image_entropy = models.FloatField(_('image entropy'), blank=True, null=True)
+    image_dominance = models.FloatField(_('image dominance'), blank=True, null=True)
+    image_class = models.CharField(_('image class'), max_length=5, blank=True, choices=image_class_choices,
+                                   db_index=True)
+
     image_score = models.FloatField(_('image score'), blank=True, null=True, db_index=True)
     image_feedback = models.TextField(_('image feedback'), blank=True)
+    image_tiles = models.BinaryField(_('image tiles'), blank=True, null=True)
+
+    resources_ok = models.PositiveIntegerField(_('resources OK'), blank=True, null=True, db_index=True)
+    resources_fail = models.PositiveIntegerField(_('resources failed'), blank=True, null=True, db_index=True)
+    resource_stats = JSONField(_('resource statistics'), blank=True, default=dict)
 
     resource_score = models.FloatField(_('resource score'), blank=True, null=True, db_index=True)
     resource_feedback = models.TextField(_('resource feedback'), blank=True)
@@ -323,6 +478,9 @@ class InstanceRunResult(models.Model):
     overall_score = models.FloatField(_('overall score'), blank=True, null=True, db_index=True)
     overall_feedback = models.TextField(_('overall feedback'), blank=True)
 
+    analysis_version = models.PositiveSmallIntegerField(_('analysis version'), blank=True, null=True, db_index=True)
+    analysis_timings = JSONField(_('analysis timings'), blank=True, default=dict)
+
     tracker = FieldTracker(fields=['when', 'analysed'])
 
     class Meta:
@@ -356,8 +514,80 @@ class InstanceRunResult(models.Model):
     instance_type.short_description = _('instance type')
     instance_type = property(instance_type)
 
+    def lane(self):
+        return self.instancerun.lane
+
+    lane.short_description = _('lane')
+    lane = property(lane)
+
+    def has_image(self):
+        return bool(self.image_digest or self.web_response.get('image'))
+
+    def open_image(self):
+        # Old results still have the screenshot in their web response
+        img_b64 = self.web_response.get('image')
+        if img_b64:
+            return io.BytesIO(base64.decodebytes(img_b64.encode('ascii')))
+
+        if self.image_digest:
+            try:
+                return screenshot_store.open(self.image_digest)
+            except FileNotFoundError:
+                pass
+
+        return None
+
+    def get_resources_ok(self):
+        # Results from before the counts were stored at ingest
+        if self.resources_ok is None:
+            return get_resource_stats(self.web_response.get('resources', []))['total']['ok']
+
+        return self.resources_ok
+
+    def get_image_tiles(self):
+        return unpack_tiles(self.image_tiles)
+
+    def similar_results(self, max_distance=0):
+        return InstanceRunResult.objects.similar_images(self.image_hash, max_distance).exclude(pk=self.pk)
+
     def trigger_analysis(self):
-        if not self.analysed:
-            analyse_instancerunresult(self.pk)
+        if not self.analysed and settings.ANALYSIS_MODE != 'testrun':
+            trigger_task(analyse_instancerunresult, self)
         else:
             self.instancerun.trigger_analysis()
+
+
+class InstanceRunResource(models.Model):
+    result = models.ForeignKey(InstanceRunResult, verbose_name=_('instance run result'), related_name='resources',
+                               on_delete=models.CASCADE)
+    url = models.TextField(_('URL'))
+    host = models.CharField(_('host'), max_length=255, blank=True, db_index=True)
+    resource_type = models.CharField(_('resource type'), max_length=50, blank=True, db_index=True)
+    success = models.BooleanField(_('success'), db_index=True)
+    status = models.PositiveSmallIntegerField(_('status'), blank=True, null=True)
+
+    class Meta:
+        verbose_name = _('instance run resource')
+        verbose_name_plural = _('instance run resources')
+        ordering = ('result', 'id')
+
+    def __str__(self):
+        return self.url
+
+    def owner(self):
+        return self.result.owner
+
+    owner.short_description = _('owner')
+    owner = property(owner)
+
+    def owner_id(self):
+        return self.result.owner_id
+
+    owner_id.short_description = _('owner ID')
+    owner_id = property(owner_id)
+
+    def is_public(self):
+        return self.result.is_public
+
+    is_public.short_description = _('is public')
+    is_public = property(is_public)
@@ -0,0 +1,149 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import logging
+
+from django.utils import timezone
+from django.utils.translation import gettext_noop
+
+from measurements.images import comparison_engine, estimate_image_score, image_cache, is_degraded, pack_tiles
+from measurements.memo import get_comparisons, store_comparisons
+from measurements.timing import stage
+
+# Increase this when the way results are scored changes, the rescore_results command updates older results
+ANALYSIS_VERSION = 2
+
+# Feedback and messages are stored untranslated, the image class of the result says which screenshot it is about
+degraded_feedback = {
+    'error': gettext_noop('Screenshot is an error page while the baseline has content'),
+    'blank': gettext_noop('Screenshot is a blank page while the baseline has content'),
+}
+degraded_messages = {
+    'error': gettext_noop('A screenshot is an error page while the baseline has content'),
+    'blank': gettext_noop('A screenshot is a blank page while the baseline has content'),
+}
+
+
+def get_image_filename(result):
+    return image_cache.get_filename(result.image_digest, result.web_response.get('image'))
+
+
+def is_degraded_result(result, baseline):
+    return is_degraded(result.image_class, [base.image_class for base in baseline])
+
+
+def estimate_scores(results, baseline):
+    scores = {}
+    for result in results:
+        # Blank and error pages get no points when the baseline has content
+        degraded = is_degraded_result(result, baseline)
+
+        # Identical or nearly identical screenshots don't need to be decoded, but then there are no tiles either
+        for base in baseline:
+            if degraded:
+                scores[result.pk, base.pk] = 0.0, '', None
+                continue
+
+            estimate = estimate_image_score(base.image_digest, base.image_hash, result.image_digest, result.image_hash)
+            scores[result.pk, base.pk] = (estimate, '', None) if estimate is not None else None
+
+    return scores
+
+
+def score_image_groups(groups):
+    # Each group is a (results, baseline) tuple. The comparisons of all groups go to the comparison engine together,
+    # one job per baseline with all its candidates, so they can all run in parallel.
+    group_scores = [estimate_scores(results, baseline) for results, baseline in groups]
+
+    # Pairs of screenshots that have been compared before don't need to be compared again
+    memo_pairs = [(base.image_digest, result.image_digest)
+                  for (results, baseline), scores in zip(groups, group_scores)
+                  for base in baseline
+                  for result in results
+                  if scores[result.pk, base.pk] is None and base.image_digest and result.image_digest]
+    memo = get_comparisons(ANALYSIS_VERSION, memo_pairs)
+
+    jobs = []
+    for (results, baseline), scores in zip(groups, group_scores):
+        for base in baseline:
+            for result in results:
+                if scores[result.pk, base.pk] is None:
+                    scores[result.pk, base.pk] = memo.get((base.image_digest, result.image_digest))
+
+            candidates = [result for result in results if scores[result.pk, base.pk] is None]
+            if candidates:
+                jobs.append((scores, base, candidates))
+
+    with stage('decode'):
+        job_files = [(get_image_filename(base), [get_image_filename(result) for result in candidates])
+                     for scores, base, candidates in jobs]
+
+    with stage('compare'):
+        job_scores = comparison_engine.compare_jobs(job_files)
+
+    compared = {}
+    for (scores, base, candidates), candidate_scores in zip(jobs, job_scores):
+        for result, score in zip(candidates, candidate_scores):
+            scores[result.pk, base.pk] = score
+            if base.image_digest and result.image_digest:
+                compared[base.image_digest, result.image_digest] = score
+
+    store_comparisons(ANALYSIS_VERSION, compared)
+
+    # If we have multiple possible combinations then choose the most positive one
+    return [[max([scores[result.pk, base.pk] + (base,) for base in baseline], key=lambda item: item[0])
+             for result in results]
+            for (results, baseline), scores in zip(groups, group_scores)]
+
+
+def score_images(results, baseline):
+    return score_image_groups([(results, baseline)])[0]
+
+
+def score_result_groups(groups):
+    # Fill in the scores of the results in each (results, baseline) group, they are not saved
+    groups = [(list(results), list(baseline)) for results, baseline in groups]
+    now = timezone.now()
+
+    for results, baseline in groups:
+        if not baseline:
+            for result in results:
+                result.image_score = 0
+                result.image_tiles = None
+                result.resource_score = 0
+                result.overall_score = 0
+                result.analysis_version = ANALYSIS_VERSION
+                result.analysed = now
+
+    groups_with_baseline = [(results, baseline) for results, baseline in groups if baseline]
+    group_scores = score_image_groups(groups_with_baseline)
+
+    for (results, baseline), image_scores in zip(groups_with_baseline, group_scores):
+        for result, (image_score, note, tiles, base) in zip(results, image_scores):
+            result.image_score = image_score
+            result.image_tiles = pack_tiles(tiles)
+            result.image_feedback = note
+
+            if is_degraded_result(result, baseline):
+                result.image_feedback = degraded_feedback[result.image_class]
+                result.instancerun.messages.update_or_create(
+                    severity=logging.WARNING,
+                    message=degraded_messages[result.image_class]
+                )
+
+            # Analyse the resources
+            result.resource_score = min(1.0, result.get_resources_ok() / (base.get_resources_ok() or 1))
+
+            # Determine the overall score
+            result.overall_score = result.image_score * result.resource_score
+
+            result.analysis_version = ANALYSIS_VERSION
+            result.analysed = now
+
+    return [results for results, baseline in groups]
+
+
+def score_results(results, baseline):
+    return score_result_groups([(results, baseline)])[0]
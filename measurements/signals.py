@@ -4,13 +4,16 @@
 # ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
 
 from datetime import timedelta
+from functools import partial
 
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils import timezone
 
+from generic.tasks import get_lane
 from measurements.models import InstanceRun, InstanceRunResult, TestRun
-from measurements.tasks import delegate_to_trillian
+from measurements.tasks.delegate import queue_delegation
 
 
 # noinspection PyUnusedLocal
@@ -20,7 +23,8 @@ def schedule_push(instance: InstanceRun, **kwargs):
     if instance.trillian_url or instance.finished:
         return
 
-    delegate_to_trillian(instance.pk)
+    transaction.on_commit(partial(queue_delegation, instance.pk, instance.trillian_id, instance.lane,
+                                  get_lane(instance.lane)))
 
 
 # noinspection PyUnusedLocal
@@ -0,0 +1,96 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import base64
+import io
+
+import numpy as np
+from PIL import Image
+
+resource_types = ('document', 'stylesheet', 'script', 'image', 'font', 'xhr')
+
+
+def make_screenshot(width, height, seed=0):
+    # Something that compresses like a web page: a white background with blocks of colour and noisy "text" lines
+    rng = np.random.RandomState(seed)
+    img = np.full((height, width, 3), 255, dtype=np.uint8)
+
+    for _ in range(height // 100):
+        top, left = rng.randint(0, height - 50), rng.randint(0, width - 50)
+        img[top:top + rng.randint(10, 200), left:left + rng.randint(10, 400)] = rng.randint(0, 256, 3)
+
+    for top in range(0, height - 12, 24):
+        line_width = rng.randint(width // 4, width)
+        img[top:top + 12, :line_width] = np.where(rng.rand(12, line_width, 1) < 0.3, 0, 255)
+
+    return img
+
+
+def encode_screenshot(img):
+    buffer = io.BytesIO()
+    Image.fromarray(img).save(buffer, format='PNG')
+    return base64.encodebytes(buffer.getvalue()).decode('ascii')
+
+
+def shifted(img):
+    # A banner or cookie notice that pushes the page down
+    out = np.full_like(img, 255)
+    out[80:] = img[:-80]
+    out[:80] = (220, 220, 250)
+    return out
+
+
+def missing_blocks(img):
+    # Images and embedded content that failed to load, their space is left empty
+    out = img.copy()
+    rng = np.random.RandomState(1)
+    height, width = img.shape[:2]
+    for _ in range(max(1, height // 400)):
+        top, left = rng.randint(0, height - 100), rng.randint(0, width - 200)
+        out[top:top + 100, left:left + 200] = 255
+    return out
+
+
+def blank(img):
+    return np.full_like(img, 255)
+
+
+def error_page(img):
+    # A browser error page: mostly one colour with a few lines of text
+    out = np.full_like(img, 240)
+    for top in range(200, 320, 30):
+        out[top:top + 12, 100:700] = 60
+    return out
+
+
+degradations = {
+    'identical': lambda img: img,
+    'shifted': shifted,
+    'missing': missing_blocks,
+    'blank': blank,
+    'error': error_page,
+}
+
+
+def make_resources(count, fail_fraction=0.0, seed=0):
+    # Resources in the format the Marvins report them
+    rng = np.random.RandomState(seed)
+    resources = []
+    for nr in range(count):
+        resource_type = resource_types[0] if nr == 0 else resource_types[rng.randint(1, len(resource_types))]
+        success = nr == 0 or rng.rand() >= fail_fraction
+        resources.append({
+            'request': {
+                'url': 'https://cdn{}.example.com/{}/{}'.format(nr % 7, resource_type, nr),
+                'resource_type': resource_type,
+                'method': 'GET',
+            },
+            'response': {
+                'status': 200 if success else 0,
+            },
+            'success': bool(success),
+        })
+
+    return resources
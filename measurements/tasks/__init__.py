@@ -3,5 +3,5 @@
 #  3-Clause License. Please see the LICENSE file in the project root directory.
 # ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
 
-from .analysis import analyse_instancerun, analyse_instancerunresult, analyse_testrun
-from .delegate import delegate_to_trillian
+from .analysis import analyse_instancerun, analyse_instancerunresult, analyse_testrun, analyse_testrun_tree
+from .delegate import delegate_batch_to_trillian, delegate_to_trillian
@@ -6,3 +6,4 @@
 from .instancerun import analyse_instancerun
 from .instancerunresult import analyse_instancerunresult
 from .testrun import analyse_testrun
+from .testruntree import analyse_testrun_tree
@@ -11,37 +11,62 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from uwsgi_tasks import RetryTaskException, task
 
-from generic.utils import print_error, print_notice, print_warning, retry_all
+from generic.utils import claim, print_error, print_notice, print_warning, release
+from measurements.timing import stage, timed
+from measurements.triggers import claim_trigger, skip_claimed
 
 
 @task(retry_count=3, retry_timeout=15)
-@atomic
+@timed('instancerun')
 def analyse_instancerun(pk):
-    from measurements.models import InstanceRun, InstanceRunResult
+    from measurements.models import InstanceRun, InstanceRunResult, TestRun
 
+    claim_trigger(InstanceRun, pk)
+
+    run = None
     try:
-        children_finished = retry_all(InstanceRunResult.objects
-                                      .filter(instancerun_id=pk)
-                                      .values_list('analysed', flat=True))
-        if not children_finished:
+        with stage('claim'):
+            run = claim(InstanceRun.objects.all(), pk)
+        if run is None:
+            print_notice(_("InstanceRun {pk} is already being analysed").format(pk=pk))
+            skip_claimed(analyse_instancerun, InstanceRun, pk)
             return
 
-        run = InstanceRun.objects.select_for_update().get(pk=pk)
         if run.analysed or not run.finished:
             return
 
+        # The last result to be analysed triggers this task again
+        pending = run.results.filter(analysed=None).first()
+        if pending:
+            # Results that were waiting for a baseline can be analysed now that the run is finished
+            pending.trigger_analysis()
+            return
+
         print_notice(_("Analysing InstanceRun {run.pk} ({run.url}) on {run.trillian.name}").format(run=run))
 
-        scores = InstanceRunResult.objects \
-            .filter(instancerun_id=pk) \
-            .values_list('image_score', 'resource_score', 'overall_score')
+        with atomic():
+            with stage('aggregate'):
+                scores = InstanceRunResult.objects \
+                    .filter(instancerun_id=pk) \
+                    .values_list('image_score', 'resource_score', 'overall_score')
 
-        run.image_score = mean([score[0] for score in scores])
-        run.resource_score = mean([score[1] for score in scores])
-        run.overall_score = mean([score[2] for score in scores])
+                # A run that was given up on can be without results, it has no scores then
+                if scores:
+                    run.image_score = mean([score[0] for score in scores])
+                    run.resource_score = mean([score[1] for score in scores])
+                    run.overall_score = mean([score[2] for score in scores])
 
-        run.analysed = timezone.now()
-        run.save()
+                # Ingest and the sweeper can update the other fields while this task runs, only save what it changed
+                run.analysed = timezone.now()
+                run.save(update_fields=['image_score', 'resource_score', 'overall_score', 'analysed'])
+
+            # Add to the running scores of the test run. The last instance run to be analysed starts the analysis of the
+            # test run.
+            with stage('parent'):
+                testrun = TestRun.objects.select_for_update().get(pk=run.testrun_id)
+                testrun.add_scores(run)
+                if not testrun.instanceruns.filter(analysed=None).exists():
+                    testrun.trigger_analysis()
 
     except RetryTaskException:
         raise
@@ -58,3 +83,7 @@ def analyse_instancerun(pk):
         ))
 
         raise RetryTaskException
+
+    finally:
+        if run is not None:
+            release([run])
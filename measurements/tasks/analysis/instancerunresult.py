@@ -5,54 +5,80 @@
 
 import sys
 
+from django.conf import settings
 from django.db.transaction import atomic
-from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from uwsgi_tasks import RetryTaskException, task
 
-from generic.utils import print_error, print_notice, print_warning, retry_get
-from measurements.utils import get_resource_stats
+from generic.utils import claim, claim_all, print_error, print_notice, print_warning, release
+from measurements.timing import get_current_timings, stage, timed
+from measurements.triggers import claim_trigger, skip_claimed
 
 
 @task(retry_count=3, retry_timeout=15)
-@atomic
+@timed('instancerunresult')
 def analyse_instancerunresult(pk):
-    from measurements.models import InstanceRunResult
-    from measurements.utils import compare_base64_images
+    from measurements.models import InstanceRun, InstanceRunResult
+    from measurements.scoring import score_results
 
+    claim_trigger(InstanceRunResult, pk)
+
+    # The claims are committed right away, the comparisons run outside of any transaction
+    claimed = []
     try:
-        result = retry_get(InstanceRunResult.objects.select_for_update(), pk=pk)
-        if result.analysed:
+        with stage('claim'):
+            result = claim(InstanceRunResult.objects.all(), pk)
+        if result is None:
+            print_notice(_("InstanceRunResult {pk} is already being analysed").format(pk=pk))
+            skip_claimed(analyse_instancerunresult, InstanceRunResult, pk)
             return
 
-        print_notice(_("Analysing InstanceRunResult {result.pk} ({result.instance_type}: {result.instancerun.url}) "
-                       "on {result.instancerun.trillian.name}").format(result=result))
-
-        baseline = result.instancerun.get_baseline()
-        if not baseline:
-            result.image_score = 0
-            result.resource_score = 0
-            result.overall_score = 0
-            result.analysed = timezone.now()
-            result.save()
+        claimed.append(result)
+        if result.analysed:
             return
 
-        # If we have multiple possible combinations then test them all and choose the most positive one
-        result.image_score, base = max([(compare_base64_images(base.web_response['image'],
-                                                               result.web_response['image']),
-                                         base)
-                                        for base in baseline])
-
-        # Analyse the resources
-        base_stats = get_resource_stats(base.web_response['resources'])
-        my_stats = get_resource_stats(result.web_response['resources'])
-        result.resource_score = min(1.0, my_stats['total']['ok'] / (base_stats['total']['ok'] or 1))
+        with stage('baseline'):
+            baseline = list(result.instancerun.get_baseline())
+        if not baseline and not result.instancerun.finished:
+            print_notice(_("No baseline for InstanceRun {result.instancerun_id} yet, "
+                           "analysis will continue when it arrives").format(result=result))
+            return
 
-        # Determine the overall score
-        result.overall_score = result.image_score * result.resource_score
+        print_notice(_("Analysing InstanceRunResult {result.pk} ({result.instance_type}: {result.instancerun.url}) "
+                       "on {result.instancerun.trillian.name}").format(result=result))
 
-        result.analysed = timezone.now()
-        result.save()
+        # Analyse the other waiting results of this run in the same pass, so the baseline is only processed once.
+        # Skip the ones that other tasks have claimed.
+        with stage('claim'):
+            siblings = claim_all(InstanceRunResult.objects
+                                 .filter(instancerun_id=result.instancerun_id, analysed=None)
+                                 .exclude(pk=result.pk))
+            claimed.extend(siblings)
+        if siblings:
+            print_notice(_("Also analysing {count} other results of InstanceRun {result.instancerun_id}").format(
+                count=len(siblings),
+                result=result
+            ))
+
+        with stage('score'):
+            analysed_results = score_results([result] + siblings, baseline)
+
+        with atomic():
+            with stage('save'):
+                timings = get_current_timings() if settings.ANALYSIS_STORE_TIMINGS else {}
+                # Ingest and the sweeper can update the other fields while this task runs, only save what it changed
+                for analysed_result in analysed_results:
+                    analysed_result.analysis_timings = timings
+                    analysed_result.save(update_fields=['image_score', 'image_tiles', 'image_feedback',
+                                                        'resource_score', 'overall_score', 'analysis_version',
+                                                        'analysed', 'analysis_timings'])
+
+            # The last result to be analysed starts the analysis of the run. The lock makes sure that of two tasks
+            # finishing at the same time, the second one sees the results of the first, so this one has to wait.
+            with stage('parent'):
+                run = InstanceRun.objects.select_for_update().get(pk=result.instancerun_id)
+                if not run.results.filter(analysed=None).exists():
+                    run.trigger_analysis()
 
     except RetryTaskException:
         raise
@@ -69,3 +95,6 @@ def analyse_instancerunresult(pk):
         ))
 
         raise RetryTaskException
+
+    finally:
+        release(claimed)
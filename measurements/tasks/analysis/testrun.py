@@ -4,60 +4,46 @@
 # ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
 
 import sys
-from statistics import mean
 
-from django.db.models import Avg
-from django.db.transaction import atomic
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from uwsgi_tasks import RetryTaskException, task
 
-from generic.utils import print_error, print_notice, print_warning, retry_all
+from generic.utils import claim, print_error, print_notice, print_warning, release
+from measurements.timing import stage, timed
+from measurements.triggers import claim_trigger, skip_claimed
 
 
 @task(retry_count=3, retry_timeout=15)
-@atomic
+@timed('testrun')
 def analyse_testrun(pk):
-    from measurements.models import (TestRun, InstanceRun, InstanceRunResult,
-                                     TestRunAverage)
+    from measurements.models import TestRun
 
+    claim_trigger(TestRun, pk)
+
+    run = None
     try:
-        children_finished = retry_all(InstanceRun.objects
-                                      .filter(testrun_id=pk)
-                                      .values_list('analysed', flat=True))
-        if not children_finished:
+        with stage('claim'):
+            run = claim(TestRun.objects.all(), pk)
+        if run is None:
+            print_notice(_("TestRun {pk} is already being analysed").format(pk=pk))
+            skip_claimed(analyse_testrun, TestRun, pk)
             return
 
-        run = TestRun.objects.select_for_update().get(pk=pk)
-        if run.analysed:
+        if run.analysed or not run.finished:
             return
 
-        print_notice(_("Analysing TestRun {run.pk} ({run.url})").format(run=run))
-
-        scores = InstanceRun.objects \
-            .filter(testrun_id=pk) \
-            .values_list('image_score', 'resource_score', 'overall_score')
-
-        run.image_score = mean([score[0] for score in scores])
-        run.resource_score = mean([score[1] for score in scores])
-        run.overall_score = mean([score[2] for score in scores])
-
-        averages = InstanceRunResult.objects \
-            .filter(instancerun__testrun_id=pk) \
-            .values('marvin__instance_type') \
-            .annotate(image_score=Avg('image_score'),
-                      resource_score=Avg('resource_score'),
-                      overall_score=Avg('overall_score'))
+        # The last instance run to be analysed triggers this task again
+        if run.instanceruns.filter(analysed=None).exists():
+            return
 
-        for average in averages:
-            TestRunAverage.objects.update_or_create(defaults={
-                'image_score': average['image_score'],
-                'resource_score': average['resource_score'],
-                'overall_score': average['overall_score'],
-            }, testrun_id=pk, instance_type=average['marvin__instance_type'])
+        print_notice(_("Analysing TestRun {run.pk} ({run.url})").format(run=run))
 
-        run.analysed = timezone.now()
-        run.save()
+        # The scores and averages are kept up to date while the instance runs are analysed, only the timestamp is
+        # left. The totals are only ever changed by their own update statements.
+        with stage('finalise'):
+            run.analysed = timezone.now()
+            run.save(update_fields=['analysed'])
 
     except RetryTaskException:
         raise
@@ -74,3 +60,7 @@ def analyse_testrun(pk):
         ))
 
         raise RetryTaskException
+
+    finally:
+        if run is not None:
+            release([run])
@@ -0,0 +1,135 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import sys
+from collections import defaultdict
+from statistics import mean
+
+from django.conf import settings
+from django.db.transaction import atomic
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from uwsgi_tasks import RetryTaskException, task
+
+from generic.utils import bulk_update, claim, claim_all, print_error, print_notice, print_warning, release
+from measurements.timing import get_current_timings, stage, timed
+from measurements.triggers import claim_trigger, skip_claimed
+
+
+def mean_scores(objs):
+    return {
+        'image_score': mean([obj.image_score for obj in objs]),
+        'resource_score': mean([obj.resource_score for obj in objs]),
+        'overall_score': mean([obj.overall_score for obj in objs]),
+    }
+
+
+@task(retry_count=3, retry_timeout=15)
+@timed('testruntree')
+def analyse_testrun_tree(pk):
+    # Analyse the results, instance runs and averages of a test run in one go, instead of a task for each of them
+    from measurements.models import InstanceRun, InstanceRunResult, TestRun
+    from measurements.scoring import score_result_groups
+
+    claim_trigger(TestRun, pk)
+
+    claimed = []
+    try:
+        with stage('claim'):
+            run = claim(TestRun.objects.all(), pk)
+        if run is None:
+            print_notice(_("TestRun {pk} is already being analysed").format(pk=pk))
+            skip_claimed(analyse_testrun_tree, TestRun, pk)
+            return
+
+        claimed.append(run)
+        if run.analysed or not run.finished:
+            return
+
+        print_notice(_("Analysing TestRun {run.pk} ({run.url}) with all its instance runs").format(run=run))
+
+        # Everything below the test run has to be ours, otherwise another task is still working on part of the tree
+        with stage('claim'):
+            instanceruns = claim_all(InstanceRun.objects.filter(testrun_id=pk).order_by('pk'))
+            claimed.extend(instanceruns)
+            results = claim_all(InstanceRunResult.objects
+                                .filter(instancerun__testrun_id=pk)
+                                .select_related('marvin', 'instancerun')
+                                .order_by('pk'))
+            claimed.extend(results)
+
+        if len(instanceruns) != run.instanceruns.count() or \
+                len(results) != InstanceRunResult.objects.filter(instancerun__testrun_id=pk).count():
+            print_notice(_("Parts of TestRun {run.pk} are being analysed by another task, retrying later").format(
+                run=run
+            ))
+            raise RetryTaskException
+
+        results_per_run = defaultdict(list)
+        for result in results:
+            results_per_run[result.instancerun_id].append(result)
+
+        # Score everything that hasn't been scored yet against the dual-stack result of its own instance run
+        groups = []
+        for instancerun in instanceruns:
+            run_results = results_per_run[instancerun.pk]
+            baseline = [result for result in run_results if result.marvin.instance_type == 'dual-stack']
+            if not baseline:
+                instancerun.report_missing_baseline()
+
+            pending = [result for result in run_results if not result.analysed]
+            if pending:
+                groups.append((pending, baseline))
+
+        with stage('score'):
+            scored = [result for group in score_result_groups(groups) for result in group]
+
+        with atomic():
+            # The timings of the whole test run up to here are stored with each of its results
+            with stage('save'):
+                timings = get_current_timings() if settings.ANALYSIS_STORE_TIMINGS else {}
+                for result in scored:
+                    result.analysis_timings = timings
+
+                bulk_update(scored, ['image_score', 'image_feedback', 'image_tiles', 'resource_score', 'overall_score',
+                                     'analysis_version', 'analysis_timings', 'analysed'])
+
+            with stage('aggregate'):
+                now = timezone.now()
+                for instancerun in instanceruns:
+                    if results_per_run[instancerun.pk]:
+                        for field, value in mean_scores(results_per_run[instancerun.pk]).items():
+                            setattr(instancerun, field, value)
+                    instancerun.analysed = now
+
+                bulk_update(instanceruns, ['image_score', 'resource_score', 'overall_score', 'analysed'])
+
+                # Everything is analysed now, count the running totals of the test run and its averages at once
+                run.recount_scores()
+                run.analysed = now
+                run.save(update_fields=['analysed'])
+
+        # Updating in bulk doesn't send signals, start the cleanup ourselves
+        for instancerun in instanceruns:
+            instancerun.trigger_cleanup()
+
+    except RetryTaskException:
+        raise
+
+    except TestRun.DoesNotExist:
+        print_warning(_("TestRun {pk} does not exist anymore").format(pk=pk))
+        return
+
+    except Exception as ex:
+        print_error(_('{name} on line {line}: {msg}').format(
+            name=type(ex).__name__,
+            line=sys.exc_info()[-1].tb_lineno,
+            msg=ex
+        ))
+
+        raise RetryTaskException
+
+    finally:
+        release(claimed)
@@ -5,11 +5,11 @@
 
 import sys
 
-import requests
 from django.utils.translation import gettext_lazy as _
 from uwsgi_tasks import RetryTaskException, task
 
-from generic.utils import TokenAuth, print_error, print_message, print_warning, retry_get
+from generic.utils import print_error, print_message, print_warning
+from instances.sessions import trillian_request
 
 
 @task(retry_count=5, retry_timeout=300)
@@ -17,8 +17,7 @@ def remove_from_trillian(pk):
     from measurements.models import InstanceRun
 
     try:
-        # Try to find the InstanceRun multiple times, in case of a race condition
-        run = retry_get(InstanceRun.objects.exclude(analysed=None), pk=pk)
+        run = InstanceRun.objects.get(pk=pk)
 
         if not run.analysed:
             print_warning(_("InstanceRun {pk} has not yet been analysed").format(pk=pk))
@@ -30,10 +29,10 @@ def remove_from_trillian(pk):
 
         print_message(_("Deleting InstanceRun {run.pk} ({run.url}) from {run.trillian.name}").format(run=run))
 
-        response = requests.request(
+        response = trillian_request(
+            trillian=run.trillian,
             method='DELETE',
             url=run.trillian_url,
-            auth=TokenAuth(run.trillian.token),
             timeout=(5, 15),
         )
 
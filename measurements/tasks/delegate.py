@@ -4,23 +4,48 @@
 # ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
 
 import sys
+from datetime import timedelta
 
 import requests
 from django.conf import settings
+from django.core.cache import cache
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from uwsgi_tasks import RetryTaskException, task
 
-from generic.utils import TokenAuth, print_error, print_message, print_warning, retry_get
+from generic.stats import get_counters, increment_counter
+from generic.tasks import get_lane, spool
+from generic.utils import bulk_update, claim, claim_all, print_error, print_message, print_warning, release
+from instances.sessions import trillian_request
+
+delegation_counters = ('batches', 'batched', 'single')
+
+# Seconds to push instance runs one by one to a Trillian that doesn't support batches before trying a batch again
+BATCH_UNSUPPORTED_TIMEOUT = 3600
+
+
+def get_instancerun_data(run):
+    return {
+        'url': run.url,
+        'callback_url': 'https://{my_hostname}{path}'.format(
+            my_hostname=settings.MY_HOSTNAME,
+            path=reverse('v1:instancerun-detail', kwargs={'pk': run.pk})
+        ),
+        'requested': run.testrun.requested.isoformat(),
+    }
 
 
 @task(retry_count=5, retry_timeout=300)
 def delegate_to_trillian(pk):
     from measurements.models import InstanceRun
 
+    run = None
     try:
-        # Try to find the InstanceRun multiple times, in case of a race condition
-        run = retry_get(InstanceRun.objects.all(), pk=pk)
+        # Claimed so that a batch doesn't push the same run at the same time
+        run = claim(InstanceRun.objects.all(), pk)
+        if run is None:
+            print_warning(_("InstanceRun {pk} is already being pushed").format(pk=pk))
+            return
 
         if run.trillian_url:
             print_warning(_("Trillian URL already exists for InstanceRun {pk}").format(pk=pk))
@@ -28,20 +53,14 @@ def delegate_to_trillian(pk):
 
         print_message(_("Pushing InstanceRun {run.pk} ({run.url}) to {run.trillian.name}").format(run=run))
 
-        response = requests.request(
+        response = trillian_request(
+            trillian=run.trillian,
             method='POST',
             url='https://{hostname}/api/v1/instanceruns/'.format(hostname=run.trillian.hostname),
-            auth=TokenAuth(run.trillian.token),
             timeout=(5, 15),
-            json={
-                'url': run.url,
-                'callback_url': 'https://{my_hostname}{path}'.format(
-                    my_hostname=settings.MY_HOSTNAME,
-                    path=reverse('v1:instancerun-detail', kwargs={'pk': run.pk})
-                ),
-                'requested': run.testrun.requested.isoformat(),
-            }
+            json=get_instancerun_data(run)
         )
+        increment_counter('delegation.single')
 
         if response.status_code != 201:
             print_error(
@@ -52,8 +71,9 @@ def delegate_to_trillian(pk):
             )
             raise RetryTaskException
 
+        # The run can be updated while it is being pushed, only save the URL
         run.trillian_url = response.json()['_url']
-        run.save()
+        run.save(update_fields=['trillian_url'])
 
         print_message(_("Trillian {run.trillian.name} accepted the task as {run.trillian_url}").format(run=run))
 
@@ -72,3 +92,167 @@ def delegate_to_trillian(pk):
         ))
 
         raise RetryTaskException
+
+    finally:
+        if run is not None:
+            release([run])
+
+
+def get_batch_key(trillian_id, kind):
+    return 'delegate_batch:{}:{}'.format(trillian_id, kind)
+
+
+def get_unsupported_key(trillian_id):
+    return 'delegate_batch:unsupported:{}'.format(trillian_id)
+
+
+def queue_delegation(pk, trillian_id, kind, lane):
+    # Instance runs for the same Trillian that come in within the batch window are pushed together. Interactive and
+    # scheduled runs are batched separately, so they keep their own lanes.
+    if not settings.DELEGATION_BATCH_WINDOW or cache.get(get_unsupported_key(trillian_id)):
+        spool(delegate_to_trillian, lane, pk)
+        return
+
+    # The key expires in case the task gets lost, the sweeper pushes whatever is left behind
+    if cache.add(get_batch_key(trillian_id, kind), True, timeout=settings.DELEGATION_BATCH_WINDOW + 60):
+        spool(delegate_batch_to_trillian, lane, trillian_id, kind,
+              at=timedelta(seconds=settings.DELEGATION_BATCH_WINDOW))
+
+
+def get_batch_results(trillian, runs):
+    # The Trillian answers with a result for each instance run, in the same order
+    try:
+        response = trillian_request(
+            trillian=trillian,
+            method='POST',
+            url='https://{hostname}/api/v1/instanceruns/batch/'.format(hostname=trillian.hostname),
+            timeout=(5, 30),
+            json={'instanceruns': [get_instancerun_data(run) for run in runs]}
+        )
+    except requests.RequestException as ex:
+        print_error(_("Pushing a batch to {trillian.name} failed: {ex}").format(trillian=trillian, ex=ex))
+        return []
+
+    if response.status_code in (404, 405):
+        print_warning(_("{trillian.name} doesn't support batches, pushing instance runs one by one").format(
+            trillian=trillian
+        ))
+        cache.set(get_unsupported_key(trillian.pk), True, timeout=BATCH_UNSUPPORTED_TIMEOUT)
+        return []
+
+    try:
+        results = response.json()['results'] if response.status_code == 200 else []
+    except (ValueError, KeyError, TypeError):
+        results = []
+
+    if len(results) != len(runs):
+        print_error(_("{trillian.name} didn't accept our batch ({response.status_code})").format(
+            trillian=trillian,
+            response=response
+        ))
+        return []
+
+    return results
+
+
+def delegate_batch(trillian, kind):
+    """
+    Push the instance runs waiting for this Trillian in batches. Returns the number of runs that were accepted and the
+    runs that weren't, those have to be pushed one by one.
+    """
+    from measurements.models import InstanceRun
+
+    pending = InstanceRun.objects.filter(trillian=trillian, trillian_url='', finished=None)
+    if kind == 'scheduled':
+        pending = pending.exclude(testrun__schedule=None)
+    else:
+        pending = pending.filter(testrun__schedule=None)
+
+    accepted = 0
+    rejected = []
+    tried = set()
+    while True:
+        pks = list(pending
+                   .exclude(pk__in=tried)
+                   .order_by('pk')
+                   .values_list('pk', flat=True)[:settings.DELEGATION_BATCH_SIZE])
+        if not pks:
+            break
+
+        tried.update(pks)
+
+        # The claims are committed before the batch is pushed, so no transaction is open during the request. Runs that
+        # are claimed already are being pushed by another task.
+        runs = claim_all(InstanceRun.objects
+                         .filter(pk__in=pks, trillian_url='')
+                         .select_related('testrun')
+                         .order_by('pk'))
+        if not runs:
+            continue
+
+        try:
+            results = get_batch_results(trillian, runs)
+            increment_counter('delegation.batches')
+            if not results:
+                # The next batch would most likely fail the same way, everything that is left goes one by one
+                rejected.extend(runs)
+                rejected.extend(pending.exclude(pk__in=tried).select_related('testrun'))
+                break
+
+            # Record what the Trillian accepted, the rest is pushed one by one after the claims are released
+            delegated = []
+            for run, result in zip(runs, results):
+                if result.get('status') == 201 and result.get('_url'):
+                    run.trillian_url = result['_url']
+                    delegated.append(run)
+                else:
+                    rejected.append(run)
+
+            bulk_update(delegated, ['trillian_url'])
+            increment_counter('delegation.batched', len(delegated))
+            accepted += len(delegated)
+
+        finally:
+            release(runs)
+
+    return accepted, rejected
+
+
+@task(retry_count=2, retry_timeout=60)
+def delegate_batch_to_trillian(trillian_id, kind):
+    from instances.models import Trillian
+
+    # Instance runs that come in from now on need a new batch
+    cache.delete(get_batch_key(trillian_id, kind))
+
+    try:
+        trillian = Trillian.objects.get(pk=trillian_id)
+
+        accepted, rejected = delegate_batch(trillian, kind)
+        if accepted:
+            print_message(_("Trillian {trillian.name} accepted a batch of {count} instance runs").format(
+                trillian=trillian,
+                count=accepted
+            ))
+
+        # The single pushes retry on their own
+        for run in rejected:
+            spool(delegate_to_trillian, get_lane(run.lane), run.pk)
+
+    except Trillian.DoesNotExist:
+        print_warning(_("Trillian {pk} does not exist anymore").format(pk=trillian_id))
+        return
+
+    except Exception as ex:
+        print_error(_('{name} on line {line}: {msg}').format(
+            name=type(ex).__name__,
+            line=sys.exc_info()[-1].tb_lineno,
+            msg=ex
+        ))
+
+        raise RetryTaskException
+
+
+def get_delegation_stats():
+    counters = get_counters(['delegation.' + name for name in delegation_counters])
+    return {name: counters['delegation.' + name] for name in delegation_counters}
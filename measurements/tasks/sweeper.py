@@ -0,0 +1,110 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _, gettext_noop
+from uwsgi_tasks import timer
+
+from generic.stats import get_counters, increment_counter
+from generic.tasks import get_lane, spool
+from generic.utils import print_notice
+from measurements.tasks.delegate import delegate_to_trillian
+
+sweep_counters = ('abandoned', 'delegated', 'results', 'instanceruns', 'testruns')
+
+
+def give_up_on_instanceruns(before):
+    # Instance runs that a Trillian never finished would keep their test run from being analysed forever. Marking
+    # them as finished starts the analysis through the signals, with whatever results did arrive.
+    from measurements.models import InstanceRun
+
+    instanceruns = InstanceRun.objects \
+        .filter(finished=None, testrun__requested__lt=before) \
+        .select_related('testrun') \
+        .order_by('pk')[:settings.SWEEPER_BATCH_SIZE]
+
+    count = 0
+    for instancerun in instanceruns:
+        instancerun.messages.update_or_create(
+            severity=logging.ERROR,
+            message=gettext_noop('Trillian did not finish in time, analysing the results that did arrive')
+        )
+        instancerun.finished = timezone.now()
+        instancerun.save()
+        count += 1
+
+    return count
+
+
+def delegate_stalled_instanceruns(before):
+    # The delegation task gives up after its retries, try again once per period
+    from measurements.models import InstanceRun
+
+    instanceruns = InstanceRun.objects \
+        .filter(finished=None, trillian_url='', testrun__requested__lt=before) \
+        .select_related('testrun') \
+        .order_by('pk')[:settings.SWEEPER_BATCH_SIZE]
+
+    count = 0
+    for instancerun in instanceruns:
+        if cache.add('sweeper:delegate:{}'.format(instancerun.pk), True, timeout=settings.SWEEPER_STALLED_AFTER):
+            spool(delegate_to_trillian, get_lane(instancerun.lane), instancerun.pk)
+            count += 1
+
+    return count
+
+
+def trigger_unanalysed(queryset):
+    # Triggers are coalesced, objects that already have a task waiting aren't queued again
+    objs = queryset.order_by('pk')[:settings.SWEEPER_BATCH_SIZE]
+    for obj in objs:
+        obj.trigger_analysis()
+
+    return len(objs)
+
+
+def sweep():
+    from measurements.models import InstanceRun, InstanceRunResult, TestRun
+
+    now = timezone.now()
+    stalled = now - timedelta(seconds=settings.SWEEPER_STALLED_AFTER)
+
+    counts = {
+        'abandoned': give_up_on_instanceruns(now - timedelta(seconds=settings.SWEEPER_GIVE_UP_AFTER)),
+        'delegated': delegate_stalled_instanceruns(stalled),
+        'results': trigger_unanalysed(InstanceRunResult.objects
+                                      .filter(analysed=None, when__lt=stalled)
+                                      .exclude(instancerun__finished=None)
+                                      .select_related('instancerun__testrun')),
+        'instanceruns': trigger_unanalysed(InstanceRun.objects
+                                           .filter(analysed=None, finished__lt=stalled)
+                                           .select_related('testrun')),
+        'testruns': trigger_unanalysed(TestRun.objects.filter(analysed=None, finished__lt=stalled)),
+    }
+
+    for name, count in counts.items():
+        if count:
+            increment_counter('sweeper.' + name, count)
+
+    return counts
+
+
+def get_sweep_stats():
+    counters = get_counters(['sweeper.' + name for name in sweep_counters])
+    return {name: counters['sweeper.' + name] for name in sweep_counters}
+
+
+# noinspection PyUnusedLocal
+@timer(seconds=settings.SWEEPER_INTERVAL)
+def sweep_runs(signal_nr):
+    counts = sweep()
+    if any(counts.values()):
+        print_notice(_("Sweeper: {abandoned} abandoned, {delegated} delegated again, analysis triggered for "
+                       "{results} results, {instanceruns} instance runs and {testruns} test runs").format(**counts))
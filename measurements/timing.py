@@ -0,0 +1,165 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from generic.stats import get_counters, increment_counter, reset_counters
+
+try:
+    # noinspection PyPackageRequirements
+    import uwsgi
+except ImportError:
+    uwsgi = None
+
+# Upper bounds of the histogram buckets in milliseconds, anything slower goes in the last bucket
+BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# The stages of each analysis task. Claiming and loading the objects is 'claim', waiting for the lock on the parent
+# and triggering it is 'parent'. The 'decode' and 'compare' screenshot stages are part of 'score'.
+task_stages = {
+    'instancerunresult': ('claim', 'baseline', 'decode', 'compare', 'score', 'save', 'parent', 'total'),
+    'instancerun': ('claim', 'aggregate', 'parent', 'total'),
+    'testrun': ('claim', 'finalise', 'total'),
+    'testruntree': ('claim', 'decode', 'compare', 'score', 'save', 'aggregate', 'total'),
+}
+
+timers = threading.local()
+
+
+def get_bucket(milliseconds):
+    for bucket in BUCKETS:
+        if milliseconds <= bucket:
+            return str(bucket)
+
+    return 'inf'
+
+
+def get_counter_prefix(task, stage):
+    return 'analysis_timing.{}.{}.'.format(task, stage)
+
+
+class StageTimer:
+    """
+    Measures how long the stages of an analysis task take. The durations are added to uWSGI metrics and to
+    histograms in the shared cache when the task is done.
+    """
+
+    def __init__(self, task):
+        self.task = task
+        self.timings = {}
+        self.start = None
+        self.previous = None
+
+    def __enter__(self):
+        # Without uWSGI the tasks triggered by this one run inline, they have their own timer
+        self.previous = getattr(timers, 'current', None)
+        self.start = time.perf_counter()
+        timers.current = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        timers.current = self.previous
+        self.add('total', time.perf_counter() - self.start)
+        self.publish()
+
+    def add(self, stage, seconds):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def get_milliseconds(self):
+        return {stage: round(seconds * 1000, 1) for stage, seconds in self.timings.items()}
+
+    def publish(self):
+        for stage, milliseconds in self.get_milliseconds().items():
+            prefix = get_counter_prefix(self.task, stage)
+            increment_counter(prefix + 'count')
+            increment_counter(prefix + 'ms', int(milliseconds))
+            increment_counter(prefix + get_bucket(milliseconds))
+
+            if uwsgi:
+                # The metrics are declared in uwsgi.ini
+                uwsgi.metric_inc('analysis.{}.{}.count'.format(self.task, stage))
+                uwsgi.metric_inc('analysis.{}.{}.us'.format(self.task, stage), int(milliseconds * 1000))
+
+
+@contextmanager
+def stage(name):
+    # Time a stage of the analysis task that is running in this thread, if any
+    timer = getattr(timers, 'current', None)
+    if timer is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+
+def timed(task):
+    # Decorator that runs the task function with a StageTimer, put it outside @atomic so the commit is included
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with StageTimer(task):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def get_current_timings():
+    # The stages timed so far by the task running in this thread, in milliseconds
+    timer = getattr(timers, 'current', None)
+    return timer.get_milliseconds() if timer else {}
+
+
+def get_percentile(histogram, count, fraction):
+    # The upper bound of the bucket that contains the percentile
+    seen = 0
+    for bucket, bucket_count in histogram.items():
+        seen += bucket_count
+        if seen >= count * fraction:
+            return bucket
+
+    return None
+
+
+def get_timing_stats():
+    bucket_names = [str(bucket) for bucket in BUCKETS] + ['inf']
+    names = [get_counter_prefix(task, stage) + name
+             for task, stages in task_stages.items()
+             for stage in stages
+             for name in ['count', 'ms'] + bucket_names]
+    counters = get_counters(names)
+
+    stats = {}
+    for task, stages in task_stages.items():
+        for stage_name in stages:
+            prefix = get_counter_prefix(task, stage_name)
+            count = counters[prefix + 'count']
+            histogram = {bucket: counters[prefix + bucket] for bucket in bucket_names}
+            stats[task, stage_name] = {
+                'count': count,
+                'mean': counters[prefix + 'ms'] / count if count else None,
+                'p50': get_percentile(histogram, count, 0.5) if count else None,
+                'p95': get_percentile(histogram, count, 0.95) if count else None,
+                'p99': get_percentile(histogram, count, 0.99) if count else None,
+                'histogram': histogram,
+            }
+
+    return stats
+
+
+def reset_timing_stats():
+    bucket_names = [str(bucket) for bucket in BUCKETS] + ['inf']
+    reset_counters([get_counter_prefix(task, stage) + name
+                    for task, stages in task_stages.items()
+                    for stage in stages
+                    for name in ['count', 'ms'] + bucket_names])
@@ -0,0 +1,63 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from generic.stats import get_counters, increment_counter
+from generic.tasks import get_lane, has_spoolers, spool
+
+KEY_PREFIX = 'trigger:'
+
+trigger_counters = ('queued', 'coalesced', 'executed', 'skipped', 'requeued')
+
+
+def get_trigger_key(model, pk):
+    return '{prefix}{label}:{pk}'.format(prefix=KEY_PREFIX, label=model._meta.label_lower, pk=pk)
+
+
+def queue_task(task, model, pk, lane):
+    # Only queue the task if there isn't one for this object already waiting in the spooler
+    if cache.add(get_trigger_key(model, pk), True, timeout=settings.ANALYSIS_TRIGGER_WINDOW):
+        increment_counter('analysis_trigger.queued')
+        spool(task, lane, pk)
+    else:
+        increment_counter('analysis_trigger.coalesced')
+
+
+def trigger_task(task, obj):
+    # Decide after the commit, a rolled back trigger shouldn't block the next one. The lane is determined now, the
+    # object might be gone by then.
+    transaction.on_commit(partial(queue_task, task, type(obj), obj.pk, get_lane(obj.lane)))
+
+
+def claim_trigger(model, pk):
+    # Called when the task starts, changes from now on need to trigger a new task
+    cache.delete(get_trigger_key(model, pk))
+    increment_counter('analysis_trigger.executed')
+
+
+def skip_claimed(task, model, pk):
+    # Another task has claimed the object. It may have started before the change that triggered this task, so try
+    # again when its claim is likely released. Triggers that come in until then are coalesced into the new task.
+    increment_counter('analysis_trigger.skipped')
+
+    # Without spoolers the task would run again right away, while the claim is still held
+    if not has_spoolers():
+        return
+
+    obj = model.objects.filter(pk=pk).first()
+    if obj is not None and cache.add(get_trigger_key(model, pk), True, timeout=settings.ANALYSIS_TRIGGER_WINDOW):
+        increment_counter('analysis_trigger.requeued')
+        spool(task, get_lane(obj.lane), pk, at=timedelta(seconds=settings.ANALYSIS_CLAIMED_DELAY))
+
+
+def get_trigger_stats():
+    counters = get_counters(['analysis_trigger.' + name for name in trigger_counters])
+    return {name: counters['analysis_trigger.' + name] for name in trigger_counters}
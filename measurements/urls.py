@@ -6,8 +6,9 @@
 from django.conf.urls import include, url
 from rest_framework import routers
 
-from measurements.api.views import (InstanceRunMessageViewSet, InstanceRunResultViewSet, InstanceRunViewSet,
-                                    ScheduleViewSet, TestRunAverageViewSet, TestRunMessageViewSet, TestRunViewSet)
+from measurements.api.views import (InstanceRunMessageViewSet, InstanceRunResourceViewSet, InstanceRunResultViewSet,
+                                    InstanceRunViewSet, ScheduleViewSet, TestRunAverageViewSet, TestRunMessageViewSet,
+                                    TestRunViewSet)
 
 # Routers provide an easy way of automatically determining the URL conf.
 measurements_router = routers.SimpleRouter()
@@ -17,6 +18,7 @@ measurements_router.register('testrunmessages', TestRunMessageViewSet, base_name
 measurements_router.register('testrunaverages', TestRunAverageViewSet, base_name='testrunaverage')
 measurements_router.register('instanceruns', InstanceRunViewSet, base_name='instancerun')
 measurements_router.register('instancerunresults', InstanceRunResultViewSet, base_name='instancerunresult')
+measurements_router.register('instancerunresources', InstanceRunResourceViewSet, base_name='instancerunresource')
 measurements_router.register('instancerunmessages', InstanceRunMessageViewSet, base_name='instancerunmessage')
 
 # Wire up our API using automatic URL routing.
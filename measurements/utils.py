@@ -3,24 +3,16 @@
 #  3-Clause License. Please see the LICENSE file in the project root directory.
 # ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
 
-import base64
-import io
 from collections import defaultdict
+from urllib.parse import urlsplit
 
-import skimage.io
 from django.utils.safestring import mark_safe
-from skimage.measure import compare_ssim
 
+from measurements.images import compare_images, decode_base64_image
 
-# noinspection PyTypeChecker
-def compare_base64_images(img1_b64, img2_b64):
-    img1_bytes = base64.decodebytes(img1_b64.encode('ascii'))
-    img1 = skimage.io.imread(io.BytesIO(img1_bytes))
-
-    img2_bytes = base64.decodebytes(img2_b64.encode('ascii'))
-    img2 = skimage.io.imread(io.BytesIO(img2_bytes))
 
-    return compare_ssim(img1, img2, multichannel=True)
+def compare_base64_images(img1_b64, img2_b64):
+    return compare_images(decode_base64_image(img1_b64), decode_base64_image(img2_b64))
 
 
 def get_resource_stats(resources):
@@ -38,14 +30,76 @@ def get_resource_stats(resources):
     return stats
 
 
+def get_resource_properties(resources):
+    # The resource counts of a result at ingest, as InstanceRunResult fields
+    try:
+        stats = get_resource_stats(resources or [])
+    except (KeyError, TypeError):
+        return {
+            'resources_ok': None,
+            'resources_fail': None,
+            'resource_stats': {},
+        }
+
+    total = stats.pop('total', {'ok': 0, 'fail': 0})
+    return {
+        'resources_ok': total['ok'],
+        'resources_fail': total['fail'],
+        'resource_stats': {resource_type: dict(counts) for resource_type, counts in stats.items()},
+    }
+
+
+def get_resource_rows(resources):
+    # The resources of a result at ingest, as InstanceRunResource fields
+    rows = []
+    for resource in resources or []:
+        try:
+            request = resource.get('request') or {}
+            response = resource.get('response') or {}
+            url = str(request.get('url', ''))
+            status = int(response.get('status') or 0)
+
+            rows.append({
+                'url': url,
+                'host': (urlsplit(url).hostname or '')[:255],
+                'resource_type': str(request.get('resource_type', ''))[:50],
+                'success': bool(resource.get('success')),
+                'status': status if 0 < status < 1000 else None,
+            })
+        except (AttributeError, TypeError, ValueError):
+            # Skip anything that doesn't look like a resource
+            continue
+
+    return rows
+
+
+def score_color(score):
+    if score < 0.8:
+        return "#d10003"
+    elif score < 0.95:
+        return "#b3a100"
+    else:
+        return "#1d803b"
+
+
 def colored_score(score, precision=2):
     if score is None:
         return '-'
-    elif score < 0.8:
-        color = "#d10003"
-    elif score < 0.95:
-        color = "#b3a100"
-    else:
-        color = "#1d803b"
 
+    color = score_color(score)
     return mark_safe(('<span style="color: {}">{:.' + str(precision) + 'f}</span>').format(color, score))
+
+
+def tiles_table(tiles, cell_size=12):
+    # Show the SSIM per tile as a grid of coloured squares laid out like the page
+    if tiles is None:
+        return '-'
+
+    rows = []
+    for row in tiles:
+        cells = ['<td title="{score:.3f}" style="padding: 0; width: {size}px; height: {size}px; '
+                 'background: {color}"></td>'.format(score=score, size=cell_size, color=score_color(score))
+                 for score in row]
+        rows.append('<tr>{}</tr>'.format(''.join(cells)))
+
+    return mark_safe('<table style="border-collapse: collapse">{}</table>'.format(''.join(rows)))
@@ -0,0 +1,23 @@
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+#  Copyright (c) 2018, S.J.M. Steffann. This software is licensed under the BSD
+#  3-Clause License. Please see the LICENSE file in the project root directory.
+# ••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••••
+
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.shortcuts import render
+from django.utils.translation import gettext_lazy as _
+
+from measurements.timing import BUCKETS, get_timing_stats
+
+
+@staff_member_required
+def analysis_timings(request):
+    rows = [dict(task=task, stage=stage, **stats) for (task, stage), stats in get_timing_stats().items()]
+
+    return render(request, 'admin/analysis_timings.html', {
+        **admin.site.each_context(request),
+        'title': _('Analysis timings'),
+        'buckets': [str(bucket) for bucket in BUCKETS] + ['inf'],
+        'rows': rows,
+    })
@@ -231,6 +231,95 @@ SWAGGER_SETTINGS = {
     'JSON_EDITOR': True,
 }
 
+# Background work is divided over lanes, each with its own spooler in uwsgi.ini. Interactive tests are never stuck
+# behind scheduled tests, and neither waits for maintenance work like cleaning up or mass re-analysis. The directories
+# have to be the same as the spoolers in uwsgi.ini.
+SPOOLER_DIR = os.path.join(BASE_DIR, 'spool')
+SPOOLER_LANES = {
+    'interactive': os.path.join(SPOOLER_DIR, 'interactive'),
+    'scheduled': os.path.join(SPOOLER_DIR, 'scheduled'),
+    'maintenance': os.path.join(SPOOLER_DIR, 'maintenance'),
+}
+
+# Screenshots as received from the Marvins, stored by their SHA-256 digest. Must be shared by all nodes, for example
+# on a network filesystem or a mounted object store bucket.
+SCREENSHOT_STORE_DIR = os.environ.get('SCREENSHOT_STORE_DIR', '') or os.path.join(BASE_DIR, 'screenshots')
+
+# Decoded screenshots shared between the spooler processes on this node
+IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR', '') or os.path.join(BASE_DIR, 'image-cache')
+IMAGE_CACHE_SIZE = int(os.environ.get('IMAGE_CACHE_SIZE', '') or 1024) * 1024 * 1024
+
+# Screenshot comparison: 'full' always compares at full resolution, 'pyramid' first tries downscaled versions and only
+# goes to full resolution when the score is between the reject and accept thresholds
+IMAGE_COMPARE_MODE = os.environ.get('IMAGE_COMPARE_MODE', '') or 'full'
+IMAGE_PYRAMID_FACTORS = [int(factor) for factor in (os.environ.get('IMAGE_PYRAMID_FACTORS', '') or '8,4').split(',')]
+IMAGE_PYRAMID_ACCEPT = float(os.environ.get('IMAGE_PYRAMID_ACCEPT', '') or 0.98)
+IMAGE_PYRAMID_REJECT = float(os.environ.get('IMAGE_PYRAMID_REJECT', '') or 0.5)
+
+# Screenshots of different sizes are aligned before comparing them: 'crop' compares the top-left area that both have in
+# common, 'pad' extends both to the largest size with white
+IMAGE_ALIGN_MODE = os.environ.get('IMAGE_ALIGN_MODE', '') or 'crop'
+
+# The SSIM of each result is also stored per tile, in a square grid of this many tiles in both directions
+IMAGE_TILE_GRID = int(os.environ.get('IMAGE_TILE_GRID', '') or 16)
+
+# Number of processes that compare screenshots on each node, 0 means one per CPU divided by the BLAS threads. They are
+# divided over all spooler processes, each of them gets at least one.
+IMAGE_COMPARE_WORKERS = int(os.environ.get('IMAGE_COMPARE_WORKERS', '') or 0)
+
+# Seconds a task waits for its screenshot comparisons before giving up and retrying later, keep it well below
+# CLAIM_TIMEOUT
+IMAGE_COMPARE_TIMEOUT = int(os.environ.get('IMAGE_COMPARE_TIMEOUT', '') or 300)
+
+# Screenshots whose perceptual hashes differ in at most this many bits are similar. With the shortcut enabled they
+# are also scored without comparing pixels, otherwise only identical screenshots are.
+IMAGE_HASH_MAX_DISTANCE = int(os.environ.get('IMAGE_HASH_MAX_DISTANCE', '') or 2)
+IMAGE_HASH_SHORTCUT = os.environ.get('IMAGE_HASH_SHORTCUT', '0') == '1'
+
+# Seconds to remember the outcome of comparing two screenshots, scheduled tests often produce the same pair again
+COMPARISON_MEMO_TIMEOUT = int(os.environ.get('COMPARISON_MEMO_TIMEOUT', '') or 7 * 24 * 3600)
+
+# Screenshots where one colour covers this fraction of the page are blank, and ones with little brightness variation
+# that are mostly one colour are error pages. These get a score of 0 without comparing when the baseline has content.
+IMAGE_BLANK_DOMINANCE = float(os.environ.get('IMAGE_BLANK_DOMINANCE', '') or 0.99)
+IMAGE_ERROR_DOMINANCE = float(os.environ.get('IMAGE_ERROR_DOMINANCE', '') or 0.9)
+IMAGE_ERROR_MAX_ENTROPY = float(os.environ.get('IMAGE_ERROR_MAX_ENTROPY', '') or 1.5)
+
+# How test runs are analysed: 'cascade' runs a task for each result, then for each instance run and then for the test
+# run, 'testrun' analyses a whole test run in one task when it is finished
+ANALYSIS_MODE = os.environ.get('ANALYSIS_MODE', '') or 'cascade'
+
+# Keep the time each stage of the analysis took with the results, the totals are always collected
+ANALYSIS_STORE_TIMINGS = os.environ.get('ANALYSIS_STORE_TIMINGS', '0') == '1'
+
+# Triggers for an object that already has an analysis task waiting in the spooler are dropped, for at most this many
+# seconds in case the task gets lost
+ANALYSIS_TRIGGER_WINDOW = int(os.environ.get('ANALYSIS_TRIGGER_WINDOW', '') or 300)
+
+# An analysis task that finds its object claimed by another task tries again after this many seconds
+ANALYSIS_CLAIMED_DELAY = int(os.environ.get('ANALYSIS_CLAIMED_DELAY', '') or 10)
+
+# Seconds after which the claim of a background task on an object is considered abandoned, and another task can take
+# over. Has to be longer than the slowest task.
+CLAIM_TIMEOUT = int(os.environ.get('CLAIM_TIMEOUT', '') or 900)
+
+# The sweeper looks for work that got stuck this often, and handles at most this many objects of each kind per sweep
+SWEEPER_INTERVAL = int(os.environ.get('SWEEPER_INTERVAL', '') or 300)
+SWEEPER_BATCH_SIZE = int(os.environ.get('SWEEPER_BATCH_SIZE', '') or 100)
+
+# Seconds after which delegation or analysis is considered stalled and is started again, and after which instance runs
+# that a Trillian never finished are given up on
+SWEEPER_STALLED_AFTER = int(os.environ.get('SWEEPER_STALLED_AFTER', '') or 1800)
+SWEEPER_GIVE_UP_AFTER = int(os.environ.get('SWEEPER_GIVE_UP_AFTER', '') or 6 * 3600)
+
+# Connections to each Trillian are kept alive and reused, this many per Trillian in each process
+TRILLIAN_POOL_SIZE = int(os.environ.get('TRILLIAN_POOL_SIZE', '') or 4)
+
+# Instance runs for the same Trillian that are created within this many seconds are pushed to it in one request, up to
+# the batch size. 0 pushes each instance run on its own.
+DELEGATION_BATCH_WINDOW = int(os.environ.get('DELEGATION_BATCH_WINDOW', '') or 0)
+DELEGATION_BATCH_SIZE = int(os.environ.get('DELEGATION_BATCH_SIZE', '') or 50)
+
 # Dump email to console for testing
 EMAIL_HOST = os.environ.get('EMAIL_HOST', '') or None
 EMAIL_PORT = os.environ.get('EMAIL_PORT', '') or 25
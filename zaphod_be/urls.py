@@ -31,6 +31,7 @@ from generic.urls import generic_router
 from generic.views import reload_uwsgi
 from instances.urls import instances_router
 from measurements.urls import measurements_router
+from measurements.views import analysis_timings
 
 router = DefaultRouter()
 router.registry.extend(generic_router.registry)
@@ -47,6 +48,7 @@ urlpatterns = [
     url(r'^docs/', include_docs_urls(title='NAT64Check Zaphod API')),
 
     url(r'^admin/reload/$', reload_uwsgi, name='reload_uwsgi'),
+    url(r'^admin/analysis-timings/$', analysis_timings, name='analysis_timings'),
 
     # TODO: Consider OTP for Admin site
     # url(r'^admin/', otp_admin_site.urls),